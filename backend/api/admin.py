@@ -2,6 +2,7 @@
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count
 from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment
 
 
@@ -11,6 +12,7 @@ class UserAdmin(BaseUserAdmin):
 
     list_display = ['username', 'email', 'role', 'first_name', 'last_name', 'is_approved', 'group']
     list_filter = ['role', 'is_approved', 'group']
+    list_select_related = ['group']
     search_fields = ['username', 'email', 'first_name', 'last_name', 'student_id']
     
 
@@ -62,16 +64,24 @@ class GroupAdmin(admin.ModelAdmin):
     list_display = ['name', 'academic_year', 'student_count', 'course_count', 'created_at']
     list_filter = ['academic_year']
     search_fields = ['name']
-    search_fields = ['name']
     filter_horizontal = ['courses']
     
+    def get_queryset(self, request):
+        # Both counts join a multi-valued relation, so each needs distinct
+        return super().get_queryset(request).annotate(
+            student_total=Count('students', distinct=True),
+            course_total=Count('courses', distinct=True),
+        )
+    
     def student_count(self, obj):
-        return obj.students.count()
+        return obj.student_total
     student_count.short_description = 'Students'
+    student_count.admin_order_field = 'student_total'
     
     def course_count(self, obj):
-        return obj.courses.count()
+        return obj.course_total
     course_count.short_description = 'Courses'
+    course_count.admin_order_field = 'course_total'
 
 
 @admin.register(Grade)
@@ -79,6 +89,7 @@ class GradeAdmin(admin.ModelAdmin):
     
     list_display = ['student', 'course', 'td_mark', 'tp_mark', 'exam_mark', 'average', 'updated_at']
     list_filter = ['course', 'student__group']
+    list_select_related = ['student', 'course']
     search_fields = ['student__username', 'student__student_id', 'course__code']
     
     fieldsets = (
@@ -95,6 +106,7 @@ class GradeAdmin(admin.ModelAdmin):
     def average(self, obj):
         return obj.average or 'N/A'
     average.short_description = 'Average'
+    average.admin_order_field = 'average'
 
 
 @admin.register(Attendance)
@@ -102,6 +114,7 @@ class AttendanceAdmin(admin.ModelAdmin):
     
     list_display = ['student', 'course', 'date', 'week_number', 'status']
     list_filter = ['status', 'course', 'date', 'week_number']
+    list_select_related = ['student', 'course']
     search_fields = ['student__username', 'course__code']
     date_hierarchy = 'date'
     
@@ -120,6 +133,7 @@ class CourseFileAdmin(admin.ModelAdmin):
     
     list_display = ['title', 'course', 'file_type', 'uploaded_by', 'created_at']
     list_filter = ['file_type', 'course', 'created_at']
+    list_select_related = ['course', 'uploaded_by']
     search_fields = ['title', 'course__code', 'uploaded_by__username']
     date_hierarchy = 'created_at'
     
@@ -145,6 +159,7 @@ class TimetableAdmin(admin.ModelAdmin):
     
     list_display = ['title', 'group', 'semester', 'academic_year', 'is_active', 'created_at']
     list_filter = ['is_active', 'group', 'semester', 'academic_year']
+    list_select_related = ['group']
     search_fields = ['title', 'group__name']
     
     fieldsets = (
@@ -174,6 +189,7 @@ class CourseAssignmentAdmin(admin.ModelAdmin):
     
     list_display = ['teacher', 'course', 'group', 'academic_year']
     list_filter = ['academic_year', 'group', 'teacher', 'course']
+    list_select_related = ['teacher', 'course', 'group']
     search_fields = ['teacher__username', 'course__name', 'group__name']
 
 
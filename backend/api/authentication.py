@@ -0,0 +1,165 @@
+"""
+Campus Connect - Token authentication
+
+Tokens issued at login carry the claims the permission classes and access
+scopes need (role, is_approved, group_id), so authenticating a request does
+not load the user row. `request.user` is a User holding only those fields;
+the rest of the row is loaded the first time anything else is read.
+
+The current token version and claims of every user are cached. An access
+token whose claims no longer match (the student was approved or moved to
+another group) is refused; refreshing it reads the user row and issues
+tokens carrying the current claims, so the change does not log anyone out.
+
+Revocation works at two levels:
+- all of a user's tokens, through `User.token_version`, copied into each
+  token as `ver`; a token whose version is behind is refused. The version
+  moves when the password changes (not when login only rehashes it) or the
+  user is deactivated (see User.save), and on `User.revoke_tokens()`
+- single tokens, by JTI, through the revocation store (see revocation.py),
+  written on logout and when a refresh token is rotated
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import User
+from .revocation import store as revocation_store
+
+# Short, so a worker whose cache missed a revocation (see checks.py) catches up quickly
+CACHE_TIMEOUT = int(min(api_settings.ACCESS_TOKEN_LIFETIME, timedelta(minutes=5)).total_seconds())
+VERSION_CLAIM = 'ver'
+# User fields copied into tokens, as named in the claims
+CLAIMS = ('role', 'is_approved', 'group_id')
+
+
+def version_key(user_id):
+    return f'token-version:{user_id}'
+
+
+def current_token_state(user_id):
+    """Return the token version and claims of an active user, or None if tokens can no longer be used"""
+    key = version_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = User.objects.filter(pk=user_id, is_active=True).values('token_version', *CLAIMS).first()
+        # False remembers a missing or inactive user
+        state = row or False
+        cache.set(key, state, CACHE_TIMEOUT)
+    return state or None
+
+
+def forget_token_version(user_id):
+    cache.delete(version_key(user_id))
+
+
+def check_token_version(token, claims=False):
+    """Refuse a revoked token and, with `claims`, one whose claims are out of date"""
+    state = current_token_state(token[api_settings.USER_ID_CLAIM])
+    if state is None:
+        raise AuthenticationFailed(_('User not found or inactive'), code='user_inactive')
+    if token.get(VERSION_CLAIM, 0) != state['token_version']:
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+    if claims and any(token.get(claim) != state[claim] for claim in CLAIMS):
+        # The client refreshes and gets tokens with the current claims
+        raise AuthenticationFailed(_('Token claims are out of date'), code='token_not_valid')
+
+
+class RevocableTokenMixin:
+    """Refuses tokens whose JTI is in the revocation store"""
+
+    def verify(self):
+        super().verify()
+        if revocation_store.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token has been revoked'))
+
+    def blacklist(self):
+        revocation_store.revoke(self)
+
+
+class CampusAccessToken(RevocableTokenMixin, AccessToken):
+    pass
+
+
+class CampusRefreshToken(RevocableTokenMixin, RefreshToken):
+    """Refresh token whose access tokens carry the user's claims"""
+
+    access_token_class = CampusAccessToken
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_claims(user)
+        return token
+
+    def set_claims(self, user):
+        for claim in CLAIMS:
+            self[claim] = getattr(user, claim)
+        self[VERSION_CLAIM] = user.token_version
+
+
+def user_from_token(token):
+    """
+    Build the authenticated user from token claims without a query
+
+    The instance only holds the claimed fields; reading any other field loads
+    the rest of the row once (see User.refresh_from_db). It is a plain User,
+    so ORM filters such as `student=request.user` and signals work as usual.
+    """
+    user_id = User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+    claims = {
+        'id': user_id,
+        'role': token['role'],
+        'is_approved': token['is_approved'],
+        'group_id': token['group_id'],
+        'is_active': True,
+        'token_version': token.get(VERSION_CLAIM, 0),
+    }
+    # from_db() takes the loaded values in the model's field order
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+    user = User.from_db(router.db_for_read(User), names, [claims[name] for name in names])
+    user._loaded_from_token = True
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication reading the user from token claims"""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if 'role' not in validated_token:
+            # Issued before tokens carried claims
+            return super().get_user(validated_token)
+        check_token_version(validated_token, claims=True)
+        return user_from_token(validated_token)
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Refuses refresh tokens that were revoked along with their access tokens
+
+    The tokens issued carry the user's current claims, not the ones copied
+    into the refresh token at login.
+    """
+
+    token_class = CampusRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if api_settings.USER_ID_CLAIM in refresh:
+            check_token_version(refresh)
+            user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+            if user is not None:
+                # Same JTI and expiry, so rotation revokes it as it would the original
+                refresh.set_claims(user)
+                attrs = {**attrs, 'refresh': str(refresh)}
+        return super().validate(attrs)
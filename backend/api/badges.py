@@ -0,0 +1,117 @@
+"""
+Campus Connect - Unread badge counts
+
+Unread notifications per type and unread messages per sender, as shown on the
+app's badges. Each count lives in its own cache entry, beside one entry per
+user listing which counts exist. Creating a message or notification bumps its
+count with cache.incr, which is atomic, and marking items read refreshes them
+all, so a badge poll is answered from the cache without touching the
+Notification or Message tables.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Message, Notification
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Sections of the counts and how each is broken down
+GROUPS = (('notifications', 'by_type'), ('messages', 'by_sender'))
+
+
+def cache_key(user_id):
+    return f'badges:{user_id}'
+
+
+def counter_key(user_id, section, key):
+    return f'badges:{user_id}:{section}:{key}'
+
+
+def count_unread(user_id):
+    """Count the unread notifications and messages of a user in the database"""
+    by_type = dict(
+        Notification.objects.filter(user_id=user_id, is_read=False)
+        .values_list('notification_type')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    by_sender = dict(
+        Message.objects.filter(receiver_id=user_id, is_read=False)
+        .values_list('sender_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    return {
+        'notifications': {'total': sum(by_type.values()), 'by_type': by_type},
+        'messages': {'total': sum(by_sender.values()), 'by_sender': by_sender},
+    }
+
+
+def _counters(user_id, layout):
+    return {
+        counter_key(user_id, section, key): (section, group, key)
+        for section, group in GROUPS
+        for key in layout[section]
+    }
+
+
+def unread_counts(user_id):
+    """Return the cached unread counts of a user, computing them on a miss"""
+    layout = cache.get(cache_key(user_id))
+    if layout is not None:
+        counters = _counters(user_id, layout)
+        values = cache.get_many(counters)
+        if len(values) == len(counters):
+            counts = {section: {'total': 0, group: {}} for section, group in GROUPS}
+            for name, (section, group, key) in counters.items():
+                if values[name]:
+                    counts[section]['total'] += values[name]
+                    counts[section][group][key] = values[name]
+            return counts
+    return refresh_unread_counts(user_id)
+
+
+def refresh_unread_counts(user_id):
+    """Recount after items were marked read and store the result"""
+    counts = count_unread(user_id)
+    # Every notification type gets a counter, so only a new sender needs a recount
+    layout = {
+        'notifications': [value for value, _ in Notification.NOTIFICATION_TYPES],
+        'messages': list(counts['messages']['by_sender']),
+    }
+    cache.set_many({
+        name: counts[section][group].get(key, 0)
+        for name, (section, group, key) in _counters(user_id, layout).items()
+    }, CACHE_TIMEOUT)
+    cache.set(cache_key(user_id), layout, CACHE_TIMEOUT)
+    return counts
+
+
+def forget_unread_counts(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def _increment(user_id, section, key):
+    layout = cache.get(cache_key(user_id))
+    if layout is None:
+        # Nothing cached yet, the next poll counts from the database
+        return
+    if key in layout[section]:
+        try:
+            cache.incr(counter_key(user_id, section, key))
+            return
+        except ValueError:
+            pass
+    # No counter to bump (a first message from this sender, or evicted): recount on the next poll
+    forget_unread_counts(user_id)
+
+
+def notification_created(notification):
+    if not notification.is_read:
+        _increment(notification.user_id, 'notifications', notification.notification_type)
+
+
+def message_created(message):
+    if not message.is_read:
+        _increment(message.receiver_id, 'messages', message.sender_id)
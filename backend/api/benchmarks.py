@@ -0,0 +1,227 @@
+"""
+Campus Connect - API benchmarks
+
+Budgets for every GET route in api/urls.py, and the runner behind
+`manage.py benchmark_api`: it requests each route as the role that uses it,
+through the full middleware and JWT authentication stack, and records wall
+time percentiles, SQL queries and response bytes.
+
+Query budgets are also enforced by the test suite on its small fixture; they
+must not grow with the data. Latency budgets are the p95 in milliseconds on
+the benchmark dataset, with a warm cache, and are only checked by the
+benchmark.
+"""
+
+import statistics
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .authentication import CampusRefreshToken
+from .models import User, CourseAssignment, CourseFile, Timetable, ScheduleSession
+from .profiling import percentile
+
+RouteBudget = namedtuple('RouteBudget', ['role', 'queries', 'p95_ms'])
+
+# Every GET route in api/urls.py: name -> (role, max queries, p95 milliseconds)
+ROUTE_BUDGETS = {
+    'profile': RouteBudget('student', 1, 50),
+    'user-search': RouteBudget('student', 2, 100),
+    'pending-students': RouteBudget('admin', 2, 100),
+    'student-list': RouteBudget('admin', 2, 100),
+    'teacher-list': RouteBudget('admin', 4, 200),
+    'db-connections': RouteBudget('admin', 0, 50),
+    'course-list': RouteBudget('student', 2, 50),
+    'course-detail': RouteBudget('student', 1, 50),
+    'teacher-courses': RouteBudget('teacher', 3, 100),
+    'student-courses': RouteBudget('student', 3, 100),
+    'group-list': RouteBudget('student', 3, 50),
+    'group-detail': RouteBudget('student', 2, 50),
+    'assignment-list': RouteBudget('admin', 3, 150),
+    'assignment-detail': RouteBudget('admin', 2, 50),
+    'grade-list': RouteBudget('teacher', 3, 150),
+    'my-grades': RouteBudget('student', 2, 100),
+    'course-grades': RouteBudget('teacher', 3, 150),
+    'gradebook': RouteBudget('teacher', 2, 150),
+    'attendance-list': RouteBudget('teacher', 3, 150),
+    'my-attendance': RouteBudget('student', 1, 100),
+    'file-list': RouteBudget('student', 3, 100),
+    'file-detail': RouteBudget('student', 1, 50),
+    'timetable-list': RouteBudget('student', 2, 100),
+    'timetable-detail': RouteBudget('student', 1, 50),
+    'my-timetable': RouteBudget('student', 1, 50),
+    'student-dashboard': RouteBudget('student', 9, 100),
+    'notifications': RouteBudget('student', 1, 100),
+    'messages': RouteBudget('student', 1, 100),
+    'conversations': RouteBudget('student', 1, 100),
+    'unread-count': RouteBudget('student', 2, 50),
+    'schedule-list': RouteBudget('admin', 2, 150),
+    'schedule-detail': RouteBudget('admin', 1, 50),
+}
+
+# GET routes measured again with query parameters, as clients send them:
+# name -> (route, parameters for the picked users, budget)
+QUERY_BUDGETS = {
+    # The ranked prefix search of the "new chat" box (see search.py)
+    'user-search:ranked': (
+        'user-search', lambda users: {'search': search_terms(users['teacher'])}, RouteBudget('student', 2, 150),
+    ),
+}
+
+# Routes that only accept writes and are covered by their own tests
+WRITE_ONLY_ROUTES = {
+    'register', 'login', 'logout', 'token_refresh',
+    'approve-student', 'reject-student', 'delete-student', 'assign-group',
+    'create-teacher', 'delete-teacher', 'assign-course',
+    'grade-update', 'attendance-bulk', 'notification-mark-read',
+    'notification-bulk-read', 'message-mark-read',
+}
+
+# Long-lived streams, covered by RealtimeTests
+STREAMING_ROUTES = {'event-stream'}
+
+
+def pick_users():
+    """
+    The busiest teacher, an approved student they teach and an admin
+
+    Busy users make for the largest responses, which is what the budgets are for.
+    """
+    teacher = (
+        User.objects.filter(role=User.TEACHER)
+        .annotate(assignment_count=Count('teaching_assignments'))
+        .order_by('-assignment_count', 'pk').first()
+    )
+    assignment = CourseAssignment.objects.filter(teacher=teacher).order_by('pk').first()
+    student = (
+        User.objects.filter(role=User.STUDENT, is_approved=True, group_id=assignment.group_id)
+        .order_by('pk').first() if assignment else None
+    )
+    admin = User.objects.filter(role=User.ADMIN).order_by('pk').first()
+    return {'admin': admin, 'teacher': teacher, 'student': student}, assignment
+
+
+def budget_of(name):
+    return ROUTE_BUDGETS[name] if name in ROUTE_BUDGETS else QUERY_BUDGETS[name][2]
+
+
+def search_terms(user):
+    """What someone looking for `user` types: the start of each name, or of the username"""
+    return ' '.join(name[:3] for name in (user.first_name, user.last_name) if name) or user.username[:4]
+
+
+def route_kwargs(name, assignment):
+    """URL arguments of `name` pointing at rows the picked users may read, or None if there are none"""
+    def pk(queryset):
+        return queryset.order_by('pk').values_list('pk', flat=True).first()
+
+    lookups = {
+        'course-detail': lambda: {'pk': assignment.course_id},
+        'group-detail': lambda: {'pk': assignment.group_id},
+        'assignment-detail': lambda: {'pk': assignment.pk},
+        'course-grades': lambda: {'course_id': assignment.pk},
+        'gradebook': lambda: {'assignment_id': assignment.pk},
+        'file-detail': lambda: {'pk': pk(CourseFile.objects.filter(course_id=assignment.course_id))},
+        'timetable-detail': lambda: {'pk': pk(Timetable.objects.filter(group_id=assignment.group_id))},
+        'schedule-detail': lambda: {'pk': pk(ScheduleSession.objects.filter(assignment=assignment))},
+    }
+    if name not in lookups:
+        return {}
+    kwargs = lookups[name]()
+    return None if None in kwargs.values() else kwargs
+
+
+def client_for(user):
+    """A client sending a real access token, so authentication is measured too"""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {CampusRefreshToken.for_user(user).access_token}')
+    return client
+
+
+def measure(client, url, repeat=20, warmup=2):
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'status': response.status_code,
+        'queries': len(context.captured_queries),
+        'bytes': len(response.content),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+def run(routes=None, repeat=20, warmup=2, progress=None):
+    """Benchmark `routes` (every budgeted route by default); returns {name: result}"""
+    users, assignment = pick_users()
+    clients = {role: client_for(user) for role, user in users.items() if user is not None}
+    targets = [(name, name, None, budget) for name, budget in ROUTE_BUDGETS.items()]
+    targets += [(name, route, params, budget) for name, (route, params, budget) in QUERY_BUDGETS.items()]
+
+    results = {}
+    for name, route, params, budget in targets:
+        if routes and name not in routes:
+            continue
+        kwargs = route_kwargs(route, assignment) if assignment else None
+        if budget.role not in clients or kwargs is None:
+            results[name] = {'role': budget.role, 'skipped': 'no data to request it with'}
+            continue
+        url = reverse(route, kwargs=kwargs)
+        if params:
+            url = f'{url}?{urlencode(params(users))}'
+        results[name] = {'role': budget.role, 'url': url, **measure(clients[budget.role], url, repeat, warmup)}
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def over_budget(results):
+    """Descriptions of every route that failed or went over its budget"""
+    failures = []
+    for name, result in results.items():
+        if 'skipped' in result:
+            continue
+        budget = budget_of(name)
+        if result['status'] != 200:
+            failures.append(f"{name}: HTTP {result['status']}")
+        if result['queries'] > budget.queries:
+            failures.append(f"{name}: {result['queries']} queries, budget is {budget.queries}")
+        if result['p95_ms'] > budget.p95_ms:
+            failures.append(f"{name}: p95 {result['p95_ms']:.1f} ms, budget is {budget.p95_ms} ms")
+    return failures
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """
+    Descriptions of routes that got worse than in `baseline`, an earlier run's results
+
+    More queries is always a regression; time and bytes may grow by `tolerance`
+    (a fraction) to absorb noise.
+    """
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if 'skipped' in result or not before or 'skipped' in before:
+            continue
+        if result['queries'] > before['queries']:
+            found.append(f"{name}: {result['queries']} queries, was {before['queries']}")
+        for metric in ('p95_ms', 'bytes'):
+            if result[metric] > before[metric] * (1 + tolerance):
+                found.append(f"{name}: {metric} {result[metric]}, was {before[metric]}")
+    return found
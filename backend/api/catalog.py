@@ -0,0 +1,71 @@
+"""
+Campus Connect - Catalog versions
+
+Courses, groups and schedules change a few times per semester but are read
+on every app launch. Each kind of catalog data has a version in the cache,
+bumped by the signals in signals.py whenever a row of it is saved or deleted.
+Catalog views key their cached responses and ETags on the versions they
+depend on, so a bump invalidates every cached page at once and nothing has
+to be scanned or deleted.
+
+Versions are nanosecond timestamps of the last change, which also gives the
+Last-Modified header. A version lost from the cache comes back as "now",
+which only costs each client one full response.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+COURSES = 'course'
+GROUPS = 'group'
+GROUP_COURSES = 'group.courses'
+GROUP_STUDENTS = 'group.students'
+ASSIGNMENTS = 'courseassignment'
+SCHEDULES = 'schedulesession'
+TEACHERS = 'teacher'
+TIMETABLES = 'timetable'
+
+# A bump makes older responses unreachable; the timeout only reclaims their memory
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def user_records(user_id):
+    """Version of one user's own rows: profile, grades, attendance, notifications"""
+    return f'user:{user_id}'
+
+
+def version_key(name):
+    return f'catalog-version:{name}'
+
+
+def get_versions(names):
+    """Return {name: version} for `names`, starting missing counters at now"""
+    keys = {version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def bump(*names):
+    now = time.time_ns()
+    current = cache.get_many([version_key(name) for name in names])
+    # Never move backwards, even when another server's clock is behind
+    cache.set_many({
+        version_key(name): max(now, current.get(version_key(name), 0) + 1)
+        for name in names
+    }, None)
+
+
+def fingerprint(scope, versions):
+    """Stable tag for a response of `scope` built at `versions`"""
+    raw = scope + '|' + '|'.join(f'{name}={versions[name]}' for name in sorted(versions))
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def last_modified(versions):
+    """Seconds since the epoch of the newest change among `versions`"""
+    return max(versions.values()) // 1_000_000_000
@@ -0,0 +1,29 @@
+"""
+Campus Connect - System checks
+
+Token versions (see authentication.py) are only revoked everywhere when every
+worker reads them from the same cache. `manage.py check --deploy` refuses a
+cache kept in each process's memory.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_CACHES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    message_class, id = (Warning, 'api.W001') if settings.DEBUG else (Error, 'api.E001')
+    return [message_class(
+        f'The default cache ({backend}) is local to each process.',
+        hint=(
+            'Revoked tokens stay usable on the other workers until their cached token version expires, '
+            'and badge counts and scopes differ between workers. Use Redis or Memcached.'
+        ),
+        id=id,
+    )]
@@ -0,0 +1,83 @@
+"""
+Campus Connect - Database connections
+
+Requests reuse database connections instead of opening one each (see
+DATABASES in settings). With psycopg 3 and psycopg_pool installed every
+worker process holds a pool; otherwise each thread keeps its connection for
+CONN_MAX_AGE seconds. Either way a connection the server dropped is replaced
+before a request uses it.
+
+This module reports how that reuse is going, per process: how many
+connections were opened, how many checkouts the pool served and how long they
+waited for a free connection. `manage.py db_connections` checks that every
+worker's pool fits in the server's max_connections.
+"""
+
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Pool statistics reported, as named by psycopg_pool
+POOL_STATS = (
+    'pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_num', 'requests_waiting',
+    'requests_wait_ms', 'requests_errors', 'requests_queued', 'connections_num', 'connections_ms',
+    'connections_errors', 'returns_bad', 'connections_lost',
+)
+
+_lock = threading.Lock()
+# alias -> connections handed to Django: opened, or checked out of the pool
+_connects = Counter()
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _connects[connection.alias] += 1
+
+
+def is_pooled(alias):
+    return bool(connections.settings[alias].get('OPTIONS', {}).get('pool'))
+
+
+def pool_stats(alias):
+    """psycopg_pool statistics of `alias` in this process, or None without a pool"""
+    pool = getattr(connections[alias], 'pool', None) if is_pooled(alias) else None
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {name: stats.get(name, 0) for name in POOL_STATS}
+
+
+def connection_stats():
+    """Connection reuse of every database alias in this process"""
+    report = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        pool = pool_stats(alias)
+        report[alias] = {
+            'vendor': connections[alias].vendor,
+            'pooled': pool is not None,
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE', 0),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS', False),
+            # Every connect() in Django: pool checkouts when pooled, new connections otherwise
+            'connects': _connects[alias],
+            'pool': pool,
+        }
+        if pool is not None:
+            requests = pool['requests_num']
+            report[alias]['mean_wait_ms'] = pool['requests_wait_ms'] / requests if requests else 0.0
+    return report
+
+
+def pool_max_size(alias):
+    """Most connections one process may hold for `alias`"""
+    pool = connections.settings[alias].get('OPTIONS', {}).get('pool')
+    if not pool:
+        # Persistent connections are per thread; without a pool there is no per-process cap
+        return None
+    options = {} if pool is True else pool
+    # psycopg_pool defaults: min_size 4, max_size equal to min_size
+    return options.get('max_size') or options.get('min_size', 4)
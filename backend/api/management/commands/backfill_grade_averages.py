@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from api.models import Grade
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored grade averages in primary-key chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of primary keys covered by each UPDATE')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        bounds = Grade.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No grades to backfill.')
+            return
+
+        updated = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            # One short transaction per chunk keeps row locks brief on a live table
+            with transaction.atomic():
+                updated += Grade.objects.filter(
+                    pk__gte=start, pk__lt=start + chunk_size
+                ).update(average=Grade.average_expression())
+            start += chunk_size
+            self.stdout.write(f'Backfilled {updated} grade(s) up to id {start - 1}')
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {updated} grade average(s).'))
@@ -0,0 +1,115 @@
+import io
+import json
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmarks
+from api.models import User
+
+DATASET_OPTIONS = ('faculties', 'groups', 'students', 'courses', 'teachers', 'weeks', 'messages', 'notifications', 'seed')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every GET route against a generated dataset in a throwaway test database, '
+        'writes the results as JSON and fails when a route goes over its budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--faculties', type=int, default=2)
+        parser.add_argument('--groups', type=int, default=5, help='Groups per faculty')
+        parser.add_argument('--students', type=int, default=40, help='Students per group')
+        parser.add_argument('--courses', type=int, default=8, help='Courses per faculty')
+        parser.add_argument('--teachers', type=int, default=6, help='Teachers per faculty')
+        parser.add_argument('--weeks', type=int, default=14, help='Weeks of attendance')
+        parser.add_argument('--messages', type=int, default=30, help='Messages per student')
+        parser.add_argument('--notifications', type=int, default=30, help='Notifications per student')
+        parser.add_argument('--seed', type=int, default=2025)
+        parser.add_argument('--repeat', type=int, default=30,
+                            help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Untimed requests per route first, so caches are warm')
+        parser.add_argument('--routes', default='',
+                            help='Comma-separated route names to benchmark (default: all)')
+        parser.add_argument('--output', default='benchmark-results.json',
+                            help='Where to write the JSON results')
+        parser.add_argument('--baseline',
+                            help='JSON results of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Growth of p95 time and bytes over the baseline allowed as noise (fraction)')
+        parser.add_argument('--existing', action='store_true',
+                            help='Benchmark the configured database as it is, without generating data')
+
+    def handle(self, *args, **options):
+        routes = {name.strip() for name in options['routes'].split(',') if name.strip()}
+        unknown = routes - set(benchmarks.ROUTE_BUDGETS) - set(benchmarks.QUERY_BUDGETS)
+        if unknown:
+            raise CommandError(f'Unknown route(s): {", ".join(sorted(unknown))}')
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read the baseline: {exc}')
+
+        setup_test_environment()
+        old_name = None
+        try:
+            if not options['existing']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                # Cached scopes and token versions belong to the other database's rows
+                cache.clear()
+                self.seed(options)
+            results = benchmarks.run(routes, options['repeat'], options['warmup'], self.report)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        document = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'dataset': None if options['existing'] else {name: options[name] for name in DATASET_OPTIONS},
+                'repeat': options['repeat'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'routes': results,
+        }
+        Path(options['output']).write_text(json.dumps(document, indent=2))
+        self.stdout.write(f"Results written to {options['output']}")
+
+        problems = benchmarks.over_budget(results)
+        if baseline is not None:
+            if baseline.get('meta', {}).get('dataset') != document['meta']['dataset']:
+                self.stdout.write(self.style.WARNING('The baseline was run on a different dataset.'))
+            problems += benchmarks.regressions(results, baseline.get('routes', {}), options['tolerance'])
+        if problems:
+            raise CommandError('Benchmark failed:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Every route is within its budget.'))
+
+    def seed(self, options):
+        self.stdout.write('Generating the benchmark dataset...')
+        call_command(
+            'generate_load_data', stdout=self.stdout if options['verbosity'] > 1 else io.StringIO(),
+            **{name: options[name] for name in DATASET_OPTIONS},
+        )
+        User.objects.create_user('bench-admin', role=User.ADMIN, is_approved=True, is_staff=True)
+
+    def report(self, name, result):
+        budget = benchmarks.budget_of(name)
+        self.stdout.write(
+            f"{name:<22}{result['role']:<9}{result['status']:>4}{result['queries']:>4}/{budget.queries:<3}"
+            f"{result['bytes'] / 1024:>9.1f} KB  p50 {result['p50_ms']:>7.1f}  p95 {result['p95_ms']:>7.1f}"
+            f"/{budget.p95_ms:<5} ms"
+        )
@@ -0,0 +1,127 @@
+import copy
+import threading
+import time
+from importlib.util import find_spec
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.db.backends.signals import connection_created
+from django.db.utils import load_backend
+
+from api.profiling import percentile
+
+MODES = ('new', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent request-shaped database work against PostgreSQL with a new connection per '
+        'request, persistent connections and a connection pool, and compares the connection overhead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Threads issuing requests at once')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per thread')
+        parser.add_argument('--pool-size', type=int, default=8,
+                            help='Pool max_size; below --concurrency, requests queue for a connection')
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help=f'Comma-separated modes to run: {", ".join(MODES)}')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if connections[alias].vendor != 'postgresql':
+            raise CommandError(f'{alias} is {connections[alias].vendor}; this benchmark needs PostgreSQL.')
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Unknown mode(s): {", ".join(sorted(unknown))}')
+        if 'pool' in modes and not (is_psycopg3 and find_spec('psycopg_pool')):
+            self.stdout.write(self.style.WARNING('Skipping pool: it needs psycopg 3 and psycopg_pool.'))
+            modes.remove('pool')
+
+        self.stdout.write(
+            f"{options['concurrency']} threads x {options['requests']} requests, pool max_size {options['pool_size']}\n"
+            f"{'mode':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'connect ms':>12}{'opened':>8}"
+        )
+        for mode in modes:
+            result = self.run(mode, alias, options)
+            self.stdout.write(
+                f"{mode:<12}{result['rate']:>9.0f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['connect_ms']:>12.3f}{result['opened']:>8}"
+            )
+
+    def settings_for(self, mode, alias, options):
+        settings_dict = copy.deepcopy(connections.settings[alias])
+        settings_dict['OPTIONS'].pop('pool', None)
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+        settings_dict['CONN_MAX_AGE'] = 60 if mode == 'persistent' else 0
+        if mode == 'pool':
+            settings_dict['OPTIONS']['pool'] = {'min_size': options['pool_size'], 'max_size': options['pool_size']}
+        return settings_dict
+
+    def run(self, mode, alias, options):
+        """Time `--requests` requests on each of `--concurrency` threads in `mode`"""
+        settings_dict = self.settings_for(mode, alias, options)
+        backend = load_backend(settings_dict['ENGINE'])
+        bench_alias = f'benchmark-{mode}'
+        latencies, connects, opened = [], [], []
+        lock = threading.Lock()
+
+        def count(sender, connection, **kwargs):
+            if connection.alias == bench_alias:
+                with lock:
+                    opened.append(1)
+
+        def worker():
+            # Connections belong to the thread that opened them, as in a real worker
+            wrapper = backend.DatabaseWrapper(copy.deepcopy(settings_dict), bench_alias)
+            timings = []
+            try:
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    # What request_started and request_finished do around every request
+                    wrapper.close_if_unusable_or_obsolete()
+                    wrapper.ensure_connection()
+                    connected = time.perf_counter()
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                    wrapper.close_if_unusable_or_obsolete()
+                    timings.append(((time.perf_counter() - started) * 1000, (connected - started) * 1000))
+            finally:
+                wrapper.close()
+            with lock:
+                latencies.extend(timing for timing, _ in timings)
+                connects.extend(connect for _, connect in timings)
+
+        connection_created.connect(count)
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+            if mode == 'pool':
+                pool = backend.DatabaseWrapper(settings_dict, bench_alias)
+                # Physical connections, not checkouts, are what the server pays for
+                opened = [1] * pool.pool.get_stats().get('connections_num', 0)
+                pool.close_pool()
+
+        if not latencies:
+            raise CommandError(f'Every {mode} worker failed; see the errors above.')
+        latencies.sort()
+        return {
+            'rate': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'connect_ms': sum(connects) / len(connects),
+            'opened': len(opened),
+        }
@@ -0,0 +1,61 @@
+import io
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.models import Grade, Attendance
+from api.parsers import FastJSONParser
+from api.serializers import GradeSerializer, AttendanceSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares the stock and fast JSON renderers and parsers on seeded grade and attendance lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help='Number of rows in each list payload')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per payload; the best one is reported')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        payloads = {
+            'grades': self.payload(GradeSerializer, Grade.objects.all(), rows),
+            'attendance': self.payload(AttendanceSerializer, Attendance.objects.all(), rows),
+        }
+        if not any(payloads.values()):
+            raise CommandError('No grades or attendance to render, seed the database first (seed_db).')
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: the fast classes fall back to the stock ones.'))
+
+        stock_renderer, fast_renderer = JSONRenderer(), renderers.FastJSONRenderer()
+        stock_parser, fast_parser = JSONParser(), FastJSONParser()
+        self.stdout.write(f"{'payload':<12}{'rows':>6}{'KB':>8}  {'step':<7}{'stock ms':>10}{'fast ms':>10}{'speedup':>9}")
+        for name, data in payloads.items():
+            if not data:
+                continue
+            body = stock_renderer.render(data)
+            if fast_renderer.render(data) != body:
+                raise CommandError(f'The fast renderer output differs from the stock one on {name}.')
+
+            steps = {
+                'render': (lambda: stock_renderer.render(data), lambda: fast_renderer.render(data)),
+                'parse': (lambda: stock_parser.parse(io.BytesIO(body)), lambda: fast_parser.parse(io.BytesIO(body))),
+            }
+            for step, (stock, fast) in steps.items():
+                stock_ms = self.best(stock, repeat)
+                fast_ms = self.best(fast, repeat)
+                self.stdout.write(
+                    f'{name:<12}{len(data):>6}{len(body) / 1024:>8.1f}  {step:<7}'
+                    f'{stock_ms:>10.2f}{fast_ms:>10.2f}{stock_ms / fast_ms:>8.1f}x'
+                )
+
+    def payload(self, serializer_class, queryset, rows):
+        queryset = serializer_class.setup_eager_loading(queryset.order_by('pk'))[:rows]
+        return list(serializer_class(queryset, many=True).data)
+
+    def best(self, func, repeat):
+        return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import database
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that every worker's database connections fit in the PostgreSQL server's "
+        'max_connections, and shows what the server holds now'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes across every app server using this database')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Threads per worker; each holds its own connection when not pooled')
+        parser.add_argument('--spare', type=int, default=5,
+                            help='Connections to leave free for migrations, shells and cron jobs')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            raise CommandError(f'{alias} is {connection.vendor}; the budget only applies to PostgreSQL.')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT current_setting('max_connections')::int, "
+                "current_setting('superuser_reserved_connections')::int"
+            )
+            max_connections, reserved = cursor.fetchone()
+            cursor.execute(
+                'SELECT state, count(*) FROM pg_stat_activity WHERE datname = current_database() '
+                'GROUP BY state ORDER BY state'
+            )
+            states = cursor.fetchall()
+
+        per_worker = database.pool_max_size(alias)
+        if per_worker is None:
+            per_worker = options['threads']
+            kind = f'{per_worker} persistent connection(s) per worker (one per thread)'
+        else:
+            kind = f'a pool of at most {per_worker} per worker'
+        planned = options['workers'] * per_worker
+        available = max_connections - reserved - options['spare']
+
+        self.stdout.write(f'Server: max_connections {max_connections}, {reserved} reserved for superusers')
+        self.stdout.write('Now connected to this database: ' + (
+            ', '.join(f'{count} {state or "unknown"}' for state, count in states) or 'none'
+        ))
+        self.stdout.write(f"Planned: {options['workers']} worker(s) x {kind} = {planned}, "
+                          f"{available} available after {options['spare']} spare")
+        if planned > available:
+            raise CommandError(
+                f'{planned} connections do not fit in {available}: lower DB_POOL_MAX_SIZE or the worker '
+                'count, or put PgBouncer in front of the server.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Within budget, {available - planned} connection(s) to spare.'))
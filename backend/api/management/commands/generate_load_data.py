@@ -0,0 +1,383 @@
+import io
+import random
+import time as clock
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api import catalog
+from api.models import (
+    User, Course, Group, CourseAssignment, ScheduleSession, Grade, Attendance,
+    CourseFile, Timetable, Message, Conversation, Notification,
+)
+
+FACULTIES = [
+    'Computer Science', 'Mathematics', 'Physics', 'Chemistry', 'Biology',
+    'Economics', 'Law', 'Medicine', 'Architecture', 'Languages',
+]
+FIRST_NAMES = ['Amine', 'Yacine', 'Sara', 'Lina', 'Karim', 'Nour', 'Rania', 'Walid', 'Ines', 'Mehdi', 'Yasmine', 'Rayan']
+LAST_NAMES = ['Benali', 'Haddad', 'Saidi', 'Mansouri', 'Bouzid', 'Cherif', 'Kaci', 'Hamdi', 'Ziani', 'Brahimi']
+DAYS = ['SUNDAY', 'MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY']
+SLOTS = [time(8), time(9, 30), time(11), time(13), time(14, 30), time(16)]
+STATUS_WEIGHTS = [(Attendance.PRESENT, 80), (Attendance.ABSENT, 10), (Attendance.LATE, 7), (Attendance.EXCUSED, 3)]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let generated rows keep their own auto_now / auto_now_add values"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_value(value):
+    """Format one value for PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+class Command(BaseCommand):
+    help = 'Generates a large deterministic dataset for load testing, written in bulk chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--faculties', type=int, default=4,
+                            help='Number of faculties (programs), each with its own courses, teachers and groups')
+        parser.add_argument('--groups', type=int, default=10,
+                            help='Groups per faculty')
+        parser.add_argument('--students', type=int, default=40,
+                            help='Students per group')
+        parser.add_argument('--courses', type=int, default=8,
+                            help='Courses per faculty, all taught to each of its groups')
+        parser.add_argument('--teachers', type=int, default=12,
+                            help='Teachers per faculty')
+        parser.add_argument('--weeks', type=int, default=14,
+                            help='Weeks of attendance per student and course')
+        parser.add_argument('--files', type=int, default=3,
+                            help='Course files per course')
+        parser.add_argument('--messages', type=int, default=20,
+                            help='Messages sent per student')
+        parser.add_argument('--notifications', type=int, default=15,
+                            help='Notifications per student')
+        parser.add_argument('--seed', type=int, default=2025,
+                            help='Random seed; the same seed and sizes give the same data')
+        parser.add_argument('--start-date', type=date.fromisoformat, default=date(2025, 9, 14),
+                            help='First day of the generated semester (YYYY-MM-DD)')
+        parser.add_argument('--prefix', default='lt',
+                            help='Up to 3 letters prefixed to generated usernames, course codes and group names')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows per INSERT or COPY')
+        parser.add_argument('--copy', action='store_true',
+                            help='Load the largest tables with COPY (PostgreSQL only)')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete data generated earlier with the same prefix first')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.chunk_size = options['chunk_size']
+        self.prefix = options['prefix']
+        if not (self.prefix.isalnum() and len(self.prefix) <= 3):
+            raise CommandError('--prefix must be 1 to 3 letters or digits.')
+        if min(options[name] for name in ('faculties', 'groups', 'students', 'courses', 'teachers', 'weeks')) < 1:
+            raise CommandError('--faculties, --groups, --students, --courses, --teachers and --weeks must be at least 1.')
+        if min(options['files'], options['messages'], options['notifications']) < 0:
+            raise CommandError('--files, --messages and --notifications cannot be negative.')
+        if self.chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs a PostgreSQL database.')
+
+        self.random = random.Random(options['seed'])
+        start = options['start_date']
+        self.start = timezone.make_aware(datetime.combine(start, time(8)))
+        self.academic_year = f'{start.year}-{start.year + 1}'
+        self.written = 0
+        began = clock.perf_counter()
+
+        users = User.objects.filter(username__startswith=f'{self.prefix}-')
+        if users.exists():
+            if not options['replace']:
+                raise CommandError(f'Data with prefix "{self.prefix}" exists, pass --replace to regenerate it.')
+            self.stdout.write('Deleting previously generated data...')
+            with transaction.atomic():
+                # The bulk of the rows go without per-row signals, the catalog is bumped below
+                for model, owners in (
+                    (Conversation, ('owner', 'peer')), (Notification, ('user',)), (Attendance, ('student',)),
+                    (Grade, ('student',)), (Message, ('sender', 'receiver')),
+                ):
+                    for owner in owners:
+                        model.objects.filter(**{f'{owner}__in': users})._raw_delete(connection.alias)
+                users.delete()
+                Group.objects.filter(name__startswith=f'{self.prefix.upper()}-').delete()
+                # Only codes shaped like generated ones (LT01-000): real courses may share the letters
+                Course.objects.filter(code__regex=rf'^{self.prefix.upper()}[0-9]{{2,}}-[0-9]{{3,}}$').delete()
+
+        with explicit_timestamps(Course, Group, Grade, Attendance, CourseFile, Timetable, Message, Notification):
+            self.generate()
+
+        # Bulk writes skip the signals that keep cached catalog responses current
+        catalog.bump(
+            catalog.COURSES, catalog.GROUPS, catalog.GROUP_COURSES, catalog.GROUP_STUDENTS,
+            catalog.ASSIGNMENTS, catalog.SCHEDULES, catalog.TEACHERS, catalog.TIMETABLES,
+        )
+        elapsed = clock.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {self.written:,} rows in {elapsed:.1f}s ({self.written / elapsed:,.0f} rows/s).'
+        ))
+
+    def generate(self):
+        options = self.options
+        password = make_password('loadtest123')
+        faculties = [
+            FACULTIES[n % len(FACULTIES)] + (f' {n // len(FACULTIES) + 1}' if n >= len(FACULTIES) else '')
+            for n in range(options['faculties'])
+        ]
+
+        courses = self.write('courses', Course, (
+            Course(
+                code=f'{self.prefix.upper()}{f:02d}-{c:03d}', name=f'{faculty} {c + 1}',
+                description=f'Course {c + 1} of the {faculty} program', credits=self.random.choice([2, 3, 4, 6]),
+                created_at=self.start,
+            )
+            for f, faculty in enumerate(faculties) for c in range(options['courses'])
+        ), options['faculties'] * options['courses'], returning=True)
+        courses_of = [courses[f * options['courses']:(f + 1) * options['courses']] for f in range(len(faculties))]
+
+        groups = self.write('groups', Group, (
+            Group(name=f'{self.prefix.upper()}-F{f:02d}-G{g:03d}', academic_year=self.academic_year, created_at=self.start)
+            for f in range(len(faculties)) for g in range(options['groups'])
+        ), options['faculties'] * options['groups'], returning=True)
+        groups_of = [groups[f * options['groups']:(f + 1) * options['groups']] for f in range(len(faculties))]
+
+        self.write('group courses', Group.courses.through, (
+            Group.courses.through(group_id=group.id, course_id=course.id)
+            for f in range(len(faculties)) for group in groups_of[f] for course in courses_of[f]
+        ), len(groups) * options['courses'])
+
+        teachers = self.write('teachers', User, (
+            User(
+                username=f'{self.prefix}-t{f:02d}{t:03d}', password=password, role=User.TEACHER, is_approved=True,
+                first_name=self.random.choice(FIRST_NAMES), last_name=self.random.choice(LAST_NAMES),
+                email=f'{self.prefix}-t{f:02d}{t:03d}@campus.test', program=faculty,
+            )
+            for f, faculty in enumerate(faculties) for t in range(options['teachers'])
+        ), options['faculties'] * options['teachers'], returning=True)
+        teachers_of = [teachers[f * options['teachers']:(f + 1) * options['teachers']] for f in range(len(faculties))]
+
+        def student(number, faculty, group):
+            return User(
+                username=f'{self.prefix}-s{number:07d}', password=password, role=User.STUDENT,
+                student_id=f'{self.prefix.upper()}{number:08d}', group_id=group.id, program=faculty,
+                # A few registrations are still waiting for approval
+                is_approved=self.random.random() > 0.02,
+                first_name=self.random.choice(FIRST_NAMES), last_name=self.random.choice(LAST_NAMES),
+                email=f'{self.prefix}-s{number:07d}@campus.test', semester=self.random.randint(1, 10),
+                birth_date=date(2000, 1, 1) + timedelta(days=self.random.randint(0, 2500)),
+            )
+
+        students = self.write('students', User, (
+            student(n, faculties[f], group)
+            for n, (f, group) in enumerate(
+                ((f, group) for f in range(len(faculties)) for group in groups_of[f] for _ in range(options['students']))
+            )
+        ), len(groups) * options['students'], returning=True)
+        students_of = {}
+        for user in students:
+            students_of.setdefault(user.group_id, []).append(user)
+
+        assignments = self.write('course assignments', CourseAssignment, (
+            CourseAssignment(
+                teacher_id=self.random.choice(teachers_of[f]).id, course_id=course.id,
+                group_id=group.id, academic_year=self.academic_year,
+            )
+            for f in range(len(faculties)) for group in groups_of[f] for course in courses_of[f]
+        ), len(groups) * options['courses'], returning=True)
+
+        self.write('schedule sessions', ScheduleSession, (
+            ScheduleSession(
+                assignment_id=assignment.id, day=self.random.choice(DAYS), start_time=slot,
+                end_time=(datetime.combine(date.min, slot) + timedelta(minutes=90)).time(),
+                room=f'R{self.random.randint(1, 60):02d}', session_type=session_type,
+            )
+            for assignment in assignments
+            for session_type, slot in zip(('LECTURE', 'TUTORIAL'), self.random.sample(SLOTS, 2))
+        ), len(assignments) * 2)
+
+        file_types = [value for value, _ in CourseFile.FILE_TYPES]
+        self.write('course files', CourseFile, (
+            CourseFile(
+                course_id=course.id, uploaded_by_id=self.random.choice(teachers_of[f]).id,
+                title=f'{course.name} - part {n + 1}', file=f'course_files/{course.code}-{n + 1}.pdf',
+                file_type=self.random.choice(file_types), created_at=self.start + timedelta(weeks=n),
+            )
+            for f in range(len(faculties)) for course in courses_of[f] for n in range(options['files'])
+        ), len(courses) * options['files'])
+
+        self.write('timetables', Timetable, (
+            Timetable(
+                group_id=group.id, title=f'{group.name} timetable', image=f'timetables/{group.name}.png',
+                semester='S1', academic_year=self.academic_year, created_at=self.start,
+            )
+            for group in groups
+        ), len(groups))
+
+        group_faculty = {group.id: f for f in range(len(faculties)) for group in groups_of[f]}
+        self.write('grades', Grade, (
+            self.grade(user, course)
+            for user in students for course in courses_of[group_faculty[user.group_id]]
+        ), len(students) * options['courses'], copy=True)
+
+        statuses, weights = zip(*STATUS_WEIGHTS)
+        self.write('attendance', Attendance, (
+            Attendance(
+                student_id=user.id, course_id=course.id, week_number=week,
+                date=(self.start + timedelta(weeks=week - 1)).date(),
+                status=self.random.choices(statuses, weights)[0], notes='',
+                created_at=self.start + timedelta(weeks=week - 1, minutes=self.random.randint(0, 600)),
+            )
+            for user in students for course in courses_of[group_faculty[user.group_id]]
+            for week in range(1, options['weeks'] + 1)
+        ), len(students) * options['courses'] * options['weeks'], copy=True)
+
+        self.write_messages(students, students_of, teachers_of, group_faculty)
+
+        span = max(options['weeks'], 1) * 7 * 24 * 60
+        types = [value for value, _ in Notification.NOTIFICATION_TYPES]
+        self.write('notifications', Notification, (
+            Notification(
+                user_id=user.id, title=f'Notice {n + 1}', message='Please check the latest update.',
+                notification_type=self.random.choice(types), is_read=self.random.random() < 0.7,
+                created_at=self.start + timedelta(minutes=self.random.randint(0, span)),
+            )
+            for user in students for n in range(options['notifications'])
+        ), len(students) * options['notifications'], copy=True)
+
+    def grade(self, user, course):
+        def mark():
+            # Some marks are not entered yet
+            return None if self.random.random() < 0.1 else Decimal(self.random.randint(0, 80)) / 4
+        moment = self.start + timedelta(days=self.random.randint(0, 90))
+        grade = Grade(
+            student_id=user.id, course_id=course.id, td_mark=mark(), tp_mark=mark(), exam_mark=mark(),
+            comments='', created_at=self.start, updated_at=moment,
+        )
+        grade.average = grade.compute_average()
+        return grade
+
+    def write_messages(self, students, students_of, teachers_of, group_faculty):
+        """Messages from each student to classmates and teachers, then the inbox rows they imply"""
+        per_user = self.options['messages']
+        span = max(self.options['weeks'], 1) * 7 * 24 * 60
+        # The inbox needs the last message of each pair, so their ids come back
+        messages = []
+
+        def generate():
+            for user in students:
+                peers = [peer for peer in students_of[user.group_id] if peer.id != user.id]
+                peers += teachers_of[group_faculty[user.group_id]]
+                if not peers:
+                    continue
+                # A handful of regular contacts, as in a real inbox
+                contacts = self.random.sample(peers, min(len(peers), 5))
+                for _ in range(per_user):
+                    peer = self.random.choice(contacts)
+                    sender, receiver = (user, peer) if self.random.random() < 0.6 else (peer, user)
+                    yield Message(
+                        sender_id=sender.id, receiver_id=receiver.id,
+                        content=f'Message about {self.random.choice(["the exam", "the lab", "homework", "the schedule"])}',
+                        timestamp=self.start + timedelta(minutes=self.random.randint(0, span)),
+                        is_read=self.random.random() < 0.8,
+                    )
+
+        self.write('messages', Message, generate(), len(students) * per_user, returning=True, collect=messages)
+
+        threads = {}
+        for message in sorted(messages, key=lambda message: (message.timestamp, message.id)):
+            for owner_id, peer_id in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+                thread = threads.setdefault((owner_id, peer_id), [None, 0])
+                thread[0] = message
+                if owner_id == message.receiver_id and not message.is_read:
+                    thread[1] += 1
+        self.write('conversations', Conversation, (
+            Conversation(
+                owner_id=owner_id, peer_id=peer_id, last_message_id=last.id,
+                last_timestamp=last.timestamp, unread_count=unread,
+            )
+            for (owner_id, peer_id), (last, unread) in threads.items()
+        ), len(threads))
+
+    def write(self, label, model, rows, total, returning=False, copy=False, collect=None):
+        """
+        Insert `rows` in chunks, printing progress and throughput
+
+        `returning` keeps the created objects, with their ids, and returns
+        them; `copy` loads through COPY when --copy is set.
+        """
+        created = collect if collect is not None else []
+        use_copy = copy and self.options['copy']
+        rows = iter(rows)
+        done = 0
+        began = clock.perf_counter()
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            # One transaction per chunk keeps locks and the WAL batches short
+            with transaction.atomic():
+                if use_copy:
+                    self.copy_rows(model, chunk)
+                else:
+                    chunk = model.objects.bulk_create(chunk)
+            if returning:
+                created.extend(chunk)
+            done += len(chunk)
+            elapsed = clock.perf_counter() - began
+            self.stdout.write(
+                f'  {label}: {done:,}/{total:,} ({done / elapsed:,.0f} rows/s)',
+                ending='\r' if done < total else '\n',
+            )
+        if not done:
+            self.stdout.write(f'  {label}: nothing to write')
+        self.written += done
+        return created
+
+    def copy_rows(self, model, objs):
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        buffer = io.StringIO()
+        for obj in objs:
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+            buffer.write('\t'.join(copy_value(value) for value in values))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        sql = f'COPY {table} ({columns}) FROM STDIN'
+        with connection.cursor() as cursor:
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.cursor.copy_expert(sql, buffer)
+            else:
+                # psycopg 3
+                with cursor.cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
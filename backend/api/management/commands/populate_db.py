@@ -125,15 +125,13 @@ class Command(BaseCommand):
         for student in [s for s in students if s.is_approved]:
             if student.group:
                 for course in student.group.courses.all():
-                    Grade.objects.get_or_create(
-                        student=student,
-                        course=course,
-                        defaults={
-                            'td_mark': random.uniform(10, 18),
-                            'tp_mark': random.uniform(12, 19),
-                            'exam_mark': random.uniform(8, 16),
-                        }
-                    )
+                    grade, _ = Grade.objects.get_or_create(student=student, course=course)
+                    # Rows provisioned empty by the grade signals still need marks
+                    if grade.td_mark is None:
+                        grade.td_mark = random.uniform(10, 18)
+                        grade.tp_mark = random.uniform(12, 19)
+                        grade.exam_mark = random.uniform(8, 16)
+                        grade.save()
 
         # 8. Attendance
         today = date.today()
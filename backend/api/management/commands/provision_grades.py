@@ -0,0 +1,27 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import User, Grade, CourseAssignment
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates the grade rows missing for existing course assignments, one group at a time; '
+        'safe to run again'
+    )
+
+    def handle(self, *args, **options):
+        courses_by_group = defaultdict(set)
+        for group_id, course_id in CourseAssignment.objects.values_list('group_id', 'course_id'):
+            courses_by_group[group_id].add(course_id)
+
+        created = 0
+        for group_id, course_ids in courses_by_group.items():
+            student_ids = User.objects.filter(role=User.STUDENT, group_id=group_id).values_list('id', flat=True)
+            # One short transaction per group keeps inserts small on a live table
+            with transaction.atomic():
+                created += len(Grade.provision(student_ids, course_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} missing grade row(s) for {len(courses_by_group)} group(s).'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes revoked-token entries whose tokens have expired, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows deleted by each DELETE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        cutoff = timezone.now()
+        expired = RevokedToken.objects.filter(expires_at__lte=cutoff)
+
+        purged = 0
+        while True:
+            # Short deletes by primary key keep the table available to logins meanwhile
+            ids = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            purged += RevokedToken.objects.filter(pk__in=ids).delete()[0]
+            self.stdout.write(f'Purged {purged} expired token(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Removed {purged} expired revoked token(s).'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the conversation inbox table from the message history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        threads = {}
+
+        messages = Message.objects.order_by('timestamp', 'id').only(
+            'id', 'sender_id', 'receiver_id', 'timestamp', 'is_read'
+        )
+        for message in messages.iterator(chunk_size=batch_size):
+            for owner_id, peer_id in ((message.sender_id, message.receiver_id), (message.receiver_id, message.sender_id)):
+                thread = threads.setdefault((owner_id, peer_id), Conversation(
+                    owner_id=owner_id, peer_id=peer_id, unread_count=0
+                ))
+                thread.last_message_id = message.id
+                thread.last_timestamp = message.timestamp
+            if not message.is_read:
+                threads[(message.receiver_id, message.sender_id)].unread_count += 1
+
+        with transaction.atomic():
+            Conversation.objects.all().delete()
+            Conversation.objects.bulk_create(threads.values(), batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(threads)} conversation(s).'))
@@ -117,16 +117,14 @@ class Command(BaseCommand):
             
             for course in student.group.courses.all():
                 # Grades
-                Grade.objects.get_or_create(
-                    student=student,
-                    course=course,
-                    defaults={
-                        'td_mark': random.uniform(10, 20),
-                        'tp_mark': random.uniform(10, 20),
-                        'exam_mark': random.uniform(8, 20),
-                        'comments': 'Great progress!' if random.random() > 0.5 else 'Needs improvement.'
-                    }
-                )
+                grade, _ = Grade.objects.get_or_create(student=student, course=course)
+                # Rows provisioned empty by the grade signals still need marks
+                if grade.td_mark is None:
+                    grade.td_mark = random.uniform(10, 20)
+                    grade.tp_mark = random.uniform(10, 20)
+                    grade.exam_mark = random.uniform(8, 20)
+                    grade.comments = 'Great progress!' if random.random() > 0.5 else 'Needs improvement.'
+                    grade.save()
                 
                 # Attendance (Last 5 weeks)
                 for w in range(1, 6):
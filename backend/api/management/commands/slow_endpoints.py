@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from api import profiling
+
+SORT_KEYS = ('p95_ms', 'p99_ms', 'p50_ms', 'db_ms', 'serialize_ms', 'render_ms', 'queries', 'bytes', 'requests')
+
+
+class Command(BaseCommand):
+    help = (
+        'Lists the slowest endpoints recorded by the profiling middleware, with the SQL '
+        'statements they repeat most per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Number of endpoints to show')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95_ms')
+        parser.add_argument('--statements', type=int, default=3,
+                            help='Repeated statements shown per endpoint')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the report as JSON')
+        parser.add_argument('--reset', action='store_true',
+                            help='Clear the recorded windows after printing them')
+
+    def handle(self, *args, **options):
+        snapshots = profiling.collect()
+        report = profiling.summarize(snapshots)
+        report.sort(key=lambda row: row[options['sort']], reverse=True)
+        report = report[:options['limit']]
+        for row in report:
+            row['statements'] = row['statements'][:options['statements']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif not report:
+            self.stdout.write(self.style.WARNING(
+                'Nothing recorded. Is PROFILING enabled, and do the workers share this cache?'
+            ))
+        else:
+            self.stdout.write(f'{len(snapshots)} process(es), sorted by {options["sort"]}')
+            for row in report:
+                roles = ', '.join(f'{role} {count}' for role, count in sorted(row['roles'].items()))
+                self.stdout.write(
+                    f"\n{row['endpoint']}  ({row['requests']} requests: {roles})\n"
+                    f"  p50 {row['p50_ms']:.1f} ms  p95 {row['p95_ms']:.1f} ms  p99 {row['p99_ms']:.1f} ms  "
+                    f"db {row['db_ms']:.1f} ms  serialize {row['serialize_ms']:.1f} ms  render {row['render_ms']:.1f} ms  "
+                    f"{row['queries']:.1f} queries  {row['bytes'] / 1024:.1f} KB"
+                )
+                for statement in row['statements']:
+                    style = self.style.WARNING if statement['max_per_request'] > 1 else str
+                    self.stdout.write(style(
+                        f"  {statement['per_request']:>6.1f}x/request (max {statement['max_per_request']})  "
+                        f"{statement['sql'][:160]}"
+                    ))
+
+        if options['reset']:
+            profiling.clear()
+            self.stdout.write('Recorded windows cleared.')
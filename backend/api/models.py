@@ -1,8 +1,15 @@
+import operator
+from decimal import Decimal, ROUND_HALF_UP
+from functools import reduce
+
 from django.db import models
+from django.db.models import Case, F, FloatField, Func, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.db.models.lookups import IsNull
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-class User(AbstractUser):
 class User(AbstractUser):
     
 
@@ -31,12 +38,74 @@ class User(AbstractUser):
     
     group = models.ForeignKey('Group', on_delete=models.SET_NULL, null=True, blank=True, related_name='students')
     
+    # Bumped whenever issued tokens must stop working (see api/authentication.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Fields whose change must stop issued tokens: a new password, or deactivation
+    TOKEN_STATE_FIELDS = ('is_active', 'password')
+    
     class Meta:
         ordering = ['username']
+        indexes = [
+            models.Index(fields=['role', 'is_approved'], name='user_role_approved_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded group so signals can tell when a student joins a group
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        instance._loaded_token_state = instance.token_state()
+        return instance
+
+    def token_state(self):
+        return {name: self.__dict__[name] for name in self.TOKEN_STATE_FIELDS if name in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_token_state', None) or {}
+        update_fields = kwargs.get('update_fields')
+        changed = {
+            name for name, value in loaded.items()
+            if self.__dict__.get(name) != value and (update_fields is None or name in update_fields)
+        }
+        if self.__dict__.pop('_password_rehashed', False):
+            changed.discard('password')
+        if 'is_active' in changed and self.is_active:
+            # Tokens issued before the deactivation were already revoked by it
+            changed.discard('is_active')
+        if changed:
+            # Issued tokens predate a password change or a deactivation; changed claims are
+            # replaced on refresh instead (see api/authentication.py)
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_token_state = self.token_state()
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            # Login re-encoding the same password under new hasher settings: tokens stay valid
+            self._password_rehashed = True
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if fields is not None and self.__dict__.pop('_loaded_from_token', False):
+            # Built from token claims: load every missing field in one query, not one per field
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using, fields, from_queryset)
+
+    def revoke_tokens(self):
+        """Invalidate every token issued to this user so far"""
+        self.token_version += 1
+        self.save(update_fields=['token_version'])
+
 
 
 class Course(models.Model):
@@ -81,9 +150,60 @@ class CourseAssignment(models.Model):
     def __str__(self):
         return f"{self.teacher.username} - {self.course.code} ({self.group.name})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember who the assignment belonged to so signals can refresh both old and new scopes
+        instance._loaded_teacher_id = instance.__dict__.get('teacher_id')
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
+
+
+class DecimalDivide(Func):
+    """Exact numeric division of two expressions"""
+    
+    arg_joiner = ' / '
+    template = '(%(expressions)s)'
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite stores whole decimals as integers and would truncate the quotient
+        dividend, divisor = self.get_source_expressions()
+        clone = self.copy()
+        clone.set_source_expressions([Cast(dividend, FloatField()), divisor])
+        return super(DecimalDivide, clone).as_sql(compiler, connection, **extra_context)
+
+
+class GradeQuerySet(models.QuerySet):
+    """Keeps the stored average in step with the marks on bulk write paths"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for grade in objs:
+            grade.average = grade.compute_average()
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if set(fields) & set(Grade.MARK_FIELDS):
+            for grade in objs:
+                grade.average = grade.compute_average()
+            if 'average' not in fields:
+                fields.append('average')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+    
+    def update(self, **kwargs):
+        marks = {name: kwargs[name] for name in Grade.MARK_FIELDS if name in kwargs}
+        if marks and 'average' not in kwargs:
+            # SET clauses see the old row, so feed the new marks into the expression
+            kwargs['average'] = Grade.average_expression(**marks)
+        return super().update(**kwargs)
 
 
 class Grade(models.Model):
+    MARK_FIELDS = ('td_mark', 'tp_mark', 'exam_mark')
+    
     student = models.ForeignKey(
         User, 
         on_delete=models.CASCADE,
@@ -114,23 +234,84 @@ class Grade(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(20)]
     )
     
+    # Mean of the marks entered so far, maintained on every write so it can be
+    # filtered, ranked and aggregated in SQL
+    average = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False)
+    
     comments = models.TextField(blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = GradeQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['course', '-average'], name='grade_course_average_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.course.code}"
     
-    @property
-    def average(self):
-        marks = [m for m in [self.td_mark, self.tp_mark, self.exam_mark] if m is not None]
-        return sum(marks) / len(marks) if marks else None
-
+    @classmethod
+    def provision(cls, student_ids, course_ids):
+        """Create the missing (student, course) grade rows in a single bulk insert"""
+        student_ids = set(student_ids)
+        course_ids = set(course_ids)
+        if not student_ids or not course_ids:
+            return []
+
+        existing = set(
+            cls.objects.filter(student_id__in=student_ids, course_id__in=course_ids)
+            .values_list('student_id', 'course_id')
+        )
+        missing = [
+            cls(student_id=student_id, course_id=course_id)
+            for student_id in student_ids
+            for course_id in course_ids
+            if (student_id, course_id) not in existing
+        ]
+        return cls.objects.bulk_create(missing, ignore_conflicts=True)
+
+    def save(self, *args, **kwargs):
+        self.average = self.compute_average()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.MARK_FIELDS):
+            kwargs['update_fields'] = {*update_fields, 'average'}
+        super().save(*args, **kwargs)
+    
+    def compute_average(self):
+        marks = [getattr(self, name) for name in self.MARK_FIELDS]
+        marks = [Decimal(str(mark)) for mark in marks if mark is not None]
+        if not marks:
+            return None
+        return (sum(marks) / len(marks)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    @classmethod
+    def average_expression(cls, **marks):
+        """
+        SQL expression for the average, matching compute_average()
+        
+        Marks passed as keyword arguments replace the current column values,
+        which lets an UPDATE compute the average from the values it writes.
+        """
+        output_field = models.DecimalField(max_digits=5, decimal_places=2)
+        terms = []
+        for name in cls.MARK_FIELDS:
+            mark = marks.get(name, F(name))
+            if not hasattr(mark, 'resolve_expression'):
+                mark = Value(mark, output_field=output_field)
+            terms.append(mark)
+        
+        total = reduce(operator.add, [
+            Coalesce(mark, Value(Decimal(0)), output_field=output_field) for mark in terms
+        ])
+        count = reduce(operator.add, [
+            Case(When(IsNull(mark, True), then=Value(0)), default=Value(1)) for mark in terms
+        ])
+        return Cast(DecimalDivide(total, NullIf(count, Value(0)), output_field=output_field), output_field)
 
 
 class Attendance(models.Model):
@@ -164,13 +345,15 @@ class Attendance(models.Model):
     class Meta:
         unique_together = ['student', 'course', 'week_number']
         ordering = ['week_number']
+        indexes = [
+            models.Index(fields=['course', 'week_number'], name='attendance_course_week_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.course.code} - {self.date}"
 
 
 
-class CourseFile(models.Model):
 class CourseFile(models.Model):
     
     FILE_TYPES = [
@@ -193,6 +376,9 @@ class CourseFile(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course', '-created_at'], name='coursefile_course_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.course.code} - {self.title}"
@@ -214,6 +400,9 @@ class Timetable(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['group', 'is_active', '-created_at'], name='timetable_group_active_idx'),
+        ]
     
     def __str__(self):
         return f"{self.group.name} - {self.title}"
@@ -229,12 +418,71 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # One index per direction so a conversation is two index range scans
+            models.Index(fields=['sender', 'receiver', 'timestamp'], name='message_sender_receiver_idx'),
+            models.Index(fields=['receiver', 'sender', 'timestamp'], name='message_receiver_sender_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender.username} to {self.receiver.username}"
 
 
 
+class Conversation(models.Model):
+    """
+    Inbox entry for one participant of a chat, kept current as messages are sent
+    
+    Each chat has two rows, one per participant, so an inbox is a single
+    indexed read of the owner's rows.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_timestamp = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['owner', 'peer']
+        ordering = ['-last_timestamp']
+        indexes = [
+            models.Index(fields=['owner', '-last_timestamp'], name='conversation_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} with {self.peer.username}"
+
+    @classmethod
+    def record(cls, message):
+        """Move both participants' threads to `message`; call inside the sending transaction"""
+        sides = (
+            (message.sender_id, message.receiver_id, 0),
+            (message.receiver_id, message.sender_id, 1),
+        )
+        for owner_id, peer_id, unread in sides:
+            thread = cls.objects.filter(owner_id=owner_id, peer_id=peer_id)
+            changes = {
+                'last_message': message,
+                'last_timestamp': message.timestamp,
+                'unread_count': F('unread_count') + unread,
+            }
+            if thread.update(**changes):
+                continue
+            _, created = cls.objects.get_or_create(
+                owner_id=owner_id,
+                peer_id=peer_id,
+                defaults={
+                    'last_message': message,
+                    'last_timestamp': message.timestamp,
+                    'unread_count': unread,
+                }
+            )
+            if not created:
+                # A concurrent first message created the row in between; count this one on top
+                thread.update(**changes)
+
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
         ('MESSAGE', 'New Message Received'),
@@ -253,6 +501,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_read_idx'),
+        ]
 
     def __str__(self):
         return f"{self.notification_type}: {self.title} for {self.user.username}"
@@ -288,3 +539,21 @@ class ScheduleSession(models.Model):
 
     def __str__(self):
         return f"{self.assignment.course.code} - {self.day} {self.start_time}"
+
+
+
+class RevokedToken(models.Model):
+    """
+    A token that must no longer be accepted before it expires
+    
+    Written on logout and when a refresh token is rotated; rows past
+    `expires_at` are purged by the purge_revoked_tokens command.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    token_type = models.CharField(max_length=20)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.token_type} {self.jti}"
@@ -0,0 +1,150 @@
+"""
+Campus Connect - Pagination
+
+Time-ordered feeds (messages, notifications, attendance, inbox) use keyset pagination:
+each page is located by the (timestamp, id) of its boundary row instead of an
+OFFSET, so deep pages cost the same as the first one and no COUNT(*) is run.
+Admin tables keep the default page-number pagination from settings.
+"""
+
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates a feed newest-first on (time_field, id)
+
+    - no parameters: the newest page
+    - `cursor`: the page of items older than the cursor (follow `next`)
+    - `since`: only items newer than the cursor, so a client can poll with the
+      `since` value of its last response and never miss a row. The page holds
+      the oldest of those items; when more remain, `next` carries on from it
+
+    Every response carries `since`, the cursor of the newest item delivered.
+    Every page, `since` pages included, is returned newest-first; feeds read
+    top to bottom in time (chats) set `chronological` to get it oldest-first.
+    """
+
+    time_field = 'created_at'
+    chronological = False
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        since = self.decode_cursor(request.query_params.get(self.since_query_param))
+        self.since = since
+
+        if cursor:
+            queryset = queryset.filter(self.before(cursor))
+        if since:
+            # Walk forward from the client's last position so a burst is never skipped
+            queryset = queryset.filter(self.after(since)).order_by(self.time_field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{self.time_field}', '-id')
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        # `boundary` is where the next page starts, `newest` is what the client has seen last
+        self.boundary = rows[-1] if rows else None
+        self.newest = (rows[-1] if since else rows[0]) if rows else None
+
+        if self.chronological != bool(since):
+            rows.reverse()
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.newest is not None:
+            since = self.encode_cursor(self.newest)
+        else:
+            since = self.request.query_params.get(self.since_query_param)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('since', since),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'since': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_more:
+            return None
+        token = self.encode_cursor(self.boundary)
+        if self.since:
+            url = remove_query_param(self.base_url, self.cursor_query_param)
+            return replace_query_param(url, self.since_query_param, token)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def before(self, cursor):
+        moment, pk = cursor
+        return Q(**{f'{self.time_field}__lt': moment}) | Q(**{self.time_field: moment, 'id__lt': pk})
+
+    def after(self, cursor):
+        moment, pk = cursor
+        return Q(**{f'{self.time_field}__gt': moment}) | Q(**{self.time_field: moment, 'id__gt': pk})
+
+    def encode_cursor(self, instance):
+        raw = f'{getattr(instance, self.time_field).isoformat()}|{instance.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+            moment, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(moment), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class MessageCursorPagination(KeysetPagination):
+    time_field = 'timestamp'
+    chronological = True
+
+
+class NotificationCursorPagination(KeysetPagination):
+    time_field = 'created_at'
+
+
+class AttendanceCursorPagination(KeysetPagination):
+    time_field = 'created_at'
+    chronological = True
+
+
+class ConversationCursorPagination(KeysetPagination):
+    time_field = 'last_timestamp'
@@ -0,0 +1,38 @@
+"""
+Campus Connect - Parsers
+
+`FastJSONParser` is the default JSON parser. It decodes UTF-8 bodies with
+orjson when it is installed (see renderers.py) and hands everything else to
+DRF's JSONParser, whose errors and strict handling of NaN it keeps.
+"""
+
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+
+def is_utf8(encoding):
+    try:
+        return codecs.lookup(encoding).name == 'utf-8'
+    except LookupError:
+        return False
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding with orjson when available"""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        # orjson only reads UTF-8 and always refuses NaN, like a strict parser
+        if orjson is None or not self.strict or not is_utf8(encoding):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,301 @@
+"""
+Campus Connect - Request profiling
+
+Opt-in middleware (PROFILING['ENABLED'] in settings) that measures every
+request: view name, role, SQL query count and time, serializer time (rows
+turned into data, see TimedSerializerMixin), render time (data turned into
+bytes) and response size. Each response gets a Server-Timing header, which
+browser dev tools show next to the request.
+
+Every process keeps a rolling window of the last PROFILING['WINDOW'] requests
+per endpoint, plus how often each SQL statement ran per request; a statement
+that runs many times in one request is an N+1 query. Windows are flushed to
+the cache every PROFILING['FLUSH_SECONDS'] so `manage.py slow_endpoints` can
+merge them, which needs a cache shared by every worker.
+"""
+
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DEFAULTS = {'ENABLED': False, 'WINDOW': 500, 'FLUSH_SECONDS': 10}
+PROCESSES_KEY = 'profiling:processes'
+# A process that stopped flushing drops out of the report after this long
+SNAPSHOT_TIMEOUT = 60 * 60
+# Distinct statements kept per endpoint; the rarest are dropped first
+MAX_STATEMENTS = 50
+
+PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+VALUES_LIST = re.compile(r'(\(\.\.\.\)|\(%s\))(?:, (?:\(\.\.\.\)|\(%s\)))+')
+PAGE_LITERALS = re.compile(r'\b(LIMIT|OFFSET) \d+\b')
+
+
+class SerializerTimer:
+    """Serializer time of one profiled request"""
+
+    def __init__(self):
+        self.ms = 0.0
+        self.depth = 0
+
+
+# Timer of the request being profiled, None when profiling is off
+_serializer_timer = ContextVar('serializer_timer', default=None)
+
+
+class TimedSerializerMixin:
+    """
+    Adds the time a serializer spends in to_representation to the profiled request
+
+    Only the outermost call is timed, so nested serializers are not counted
+    twice; a list adds up its items. Queries run meanwhile count here and in
+    the database time.
+    """
+
+    def to_representation(self, instance):
+        timer = _serializer_timer.get()
+        if timer is None or timer.depth:
+            return super().to_representation(instance)
+        timer.depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timer.ms += (time.perf_counter() - started) * 1000
+            timer.depth -= 1
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted `values`"""
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def normalize_sql(sql):
+    """`sql` with the parts that vary between runs of one query folded, so they count as one"""
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    sql = VALUES_LIST.sub(r'\1, ...', sql)
+    return PAGE_LITERALS.sub(r'\1 %s', sql)
+
+
+class QueryLog:
+    """execute_wrapper recording every statement run while it is installed"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[normalize_sql(sql)] += 1
+
+
+class EndpointStats:
+    """Rolling window of one endpoint's requests"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.roles = Counter()
+        # statement -> [executions, requests that ran it, most runs in one request]
+        self.statements = {}
+
+    def add(self, role, sample, statements):
+        self.samples.append(sample)
+        self.requests += 1
+        self.roles[role] += 1
+        for sql, runs in statements.items():
+            stats = self.statements.setdefault(sql, [0, 0, 0])
+            stats[0] += runs
+            stats[1] += 1
+            stats[2] = max(stats[2], runs)
+        if len(self.statements) > MAX_STATEMENTS * 2:
+            kept = sorted(self.statements.items(), key=lambda item: item[1][0], reverse=True)
+            self.statements = dict(kept[:MAX_STATEMENTS])
+
+    def snapshot(self):
+        return {
+            'samples': list(self.samples),
+            'requests': self.requests,
+            'roles': dict(self.roles),
+            'statements': self.statements,
+        }
+
+
+class Recorder:
+    """Per-process aggregation of profiled requests"""
+
+    # Fields of a sample, in order
+    FIELDS = ('total_ms', 'db_ms', 'serialize_ms', 'render_ms', 'queries', 'bytes')
+
+    def __init__(self):
+        self.process = f'{socket.gethostname()}:{os.getpid()}'
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.endpoints = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, endpoint, role, sample, statements):
+        config = profiling_settings()
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats(config['WINDOW'])
+            stats.add(role, sample, statements)
+            due = time.monotonic() - self.last_flush >= config['FLUSH_SECONDS']
+            if due:
+                self.last_flush = time.monotonic()
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in self.endpoints.items()}
+
+    def flush(self):
+        """Publish this process's windows for `manage.py slow_endpoints`"""
+        cache.set(f'profiling:snapshot:{self.process}', self.snapshot(), SNAPSHOT_TIMEOUT)
+        processes = cache.get(PROCESSES_KEY, set())
+        if self.process not in processes:
+            # Two processes registering at once may lose one; it registers again on its next flush
+            cache.set(PROCESSES_KEY, processes | {self.process}, None)
+
+
+recorder = Recorder()
+
+
+def collect():
+    """Snapshots flushed by every live process: {process: {endpoint: snapshot}}"""
+    processes = cache.get(PROCESSES_KEY, set())
+    found = cache.get_many([f'profiling:snapshot:{process}' for process in processes])
+    return {key.split(':', 2)[2]: snapshot for key, snapshot in found.items()}
+
+
+def clear():
+    cache.delete_many([f'profiling:snapshot:{process}' for process in cache.get(PROCESSES_KEY, set())])
+    cache.delete(PROCESSES_KEY)
+    recorder.reset()
+
+
+def summarize(snapshots):
+    """
+    Merge process snapshots into one report row per endpoint
+
+    Percentiles are over the merged windows, so they describe the most recent
+    requests of every process.
+    """
+    merged = {}
+    for endpoints in snapshots.values():
+        for endpoint, snapshot in endpoints.items():
+            row = merged.setdefault(endpoint, {'samples': [], 'requests': 0, 'roles': Counter(), 'statements': {}})
+            row['samples'] += snapshot['samples']
+            row['requests'] += snapshot['requests']
+            row['roles'].update(snapshot['roles'])
+            for sql, (executions, requests, most) in snapshot['statements'].items():
+                stats = row['statements'].setdefault(sql, [0, 0, 0])
+                stats[0] += executions
+                stats[1] += requests
+                stats[2] = max(stats[2], most)
+
+    report = []
+    for endpoint, row in merged.items():
+        if not row['samples']:
+            continue
+        columns = dict(zip(Recorder.FIELDS, zip(*row['samples'])))
+        total = sorted(columns['total_ms'])
+        statements = [
+            {'sql': sql, 'executions': executions, 'per_request': executions / requests, 'max_per_request': most}
+            for sql, (executions, requests, most) in row['statements'].items()
+        ]
+        statements.sort(key=lambda statement: (statement['per_request'], statement['executions']), reverse=True)
+        report.append({
+            'endpoint': endpoint,
+            'requests': row['requests'],
+            'roles': dict(row['roles']),
+            'p50_ms': percentile(total, 0.50),
+            'p95_ms': percentile(total, 0.95),
+            'p99_ms': percentile(total, 0.99),
+            'db_ms': sum(columns['db_ms']) / len(total),
+            'serialize_ms': sum(columns['serialize_ms']) / len(total),
+            'render_ms': sum(columns['render_ms']) / len(total),
+            'queries': sum(columns['queries']) / len(total),
+            'bytes': sum(columns['bytes']) / len(total),
+            'statements': statements,
+        })
+    return report
+
+
+class ProfilingMiddleware:
+    """
+    Times each request and adds a Server-Timing header
+
+    Place it first in MIDDLEWARE so the total covers the other middleware too.
+    Removes itself from the stack unless PROFILING['ENABLED'] is set.
+    """
+
+    def __init__(self, get_response):
+        if not profiling_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryLog()
+        timer = SerializerTimer()
+        token = _serializer_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(queries))
+                response = self.get_response(request)
+        finally:
+            _serializer_timer.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = queries.duration * 1000
+        render_ms = getattr(request, '_profiling_render_ms', 0.0)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{queries.count} queries"',
+            f'serialize;dur={timer.ms:.1f}',
+            f'render;dur={render_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        match = request.resolver_match
+        endpoint = f'{request.method} {match.view_name if match else "unresolved"}'
+        role = getattr(getattr(request, 'user', None), 'role', None) or 'anonymous'
+        size = 0 if response.streaming else len(response.content)
+        recorder.record(
+            endpoint, role, (total_ms, db_ms, timer.ms, render_ms, queries.count, size), queries.statements,
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that separately
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._profiling_render_ms = (time.perf_counter() - started) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
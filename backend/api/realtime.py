@@ -0,0 +1,216 @@
+"""
+Campus Connect - Real-time push
+
+New messages and notifications are pushed to connected clients over a
+Server-Sent Events stream served by the ASGI application (backend/asgi.py).
+
+Fan-out goes through a broker chosen by the REALTIME_BROKER setting. A broker
+has `publish(user_id, event)`, callable from sync code, and an async
+`subscribe(user_id)` returning a subscription with async `get()` and `close()`.
+- `InMemoryBroker` (default) delivers within the current process, which is
+  enough for a single ASGI worker and for tests
+- `RedisBroker` publishes through Redis pub/sub (or any server speaking the
+  Redis protocol) so every worker sees every event
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .authentication import StatelessJWTAuthentication
+
+HEARTBEAT_SECONDS = 15
+
+
+class InMemoryBroker:
+    """Delivers events to subscribers living in this process"""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, user_id, event):
+        """Queue `event` for every open stream of `user_id`; safe to call from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, event)
+
+    async def subscribe(self, user_id):
+        # Token claims carry the id as a string, model instances as an int
+        subscription = InMemorySubscription(self, str(user_id))
+        with self._lock:
+            self._subscribers[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+
+class InMemorySubscription:
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class RedisBroker:
+    """Fans events out through Redis pub/sub so every worker receives them"""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='campus-connect:events', **options):
+        import redis
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def channel(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def publish(self, user_id, event):
+        self._client.publish(self.channel(user_id), json.dumps(event, default=str))
+
+    async def subscribe(self, user_id):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel(user_id))
+        return RedisSubscription(client, pubsub)
+
+
+class RedisSubscription:
+
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self):
+        async for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = dict(getattr(settings, 'REALTIME_BROKER', {}))
+                backend = import_string(config.pop('BACKEND', 'api.realtime.InMemoryBroker'))
+                _broker = backend(**{key.lower(): value for key, value in config.items()})
+    return _broker
+
+
+def reset_broker():
+    """Drop the configured broker so the next call rebuilds it (used by tests)"""
+    global _broker
+    _broker = None
+
+
+def publish(user_id, event_type, payload):
+    get_broker().publish(user_id, {'type': event_type, 'data': payload})
+
+
+def stream_token(request):
+    """
+    The raw access token sent with a stream request
+
+    Browsers' EventSource cannot set headers, so a `token` query parameter is
+    accepted when there is no Authorization header. A URL ends up in server and
+    proxy logs: clients should prefer the header, and an open stream is
+    rechecked on every heartbeat so a logged token is only good until it
+    expires or is revoked.
+    """
+    authentication = StatelessJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    return raw_token or request.GET.get('token') or None
+
+
+def authenticate_stream(raw_token):
+    """Return the user of a raw access token, or None once it expired or was revoked"""
+    authentication = StatelessJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+def format_event(event):
+    data = json.dumps(event['data'], default=str)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events stream of the current user's new messages and notifications
+
+    The stream ends with an `unauthorized` event at the first heartbeat after
+    its token expired or was revoked; the client reconnects with a new token.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The event stream is only served by the ASGI application'}, status=501)
+
+    # May read the token version from the database on a cache miss
+    raw_token = stream_token(request)
+    user = await sync_to_async(authenticate_stream)(raw_token) if raw_token else None
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+
+    # Subscribe before the response starts so nothing sent meanwhile is lost
+    subscription = await get_broker().subscribe(user.pk)
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        checked = loop.time()
+        try:
+            yield ': connected\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    event = None
+                # Once per heartbeat, busy or idle, the token must still be good: not expired or revoked
+                if loop.time() - checked >= HEARTBEAT_SECONDS:
+                    if await sync_to_async(authenticate_stream)(raw_token) is None:
+                        yield format_event({'type': 'unauthorized', 'data': {}})
+                        return
+                    checked = loop.time()
+                yield ': ping\n\n' if event is None else format_event(event)
+        finally:
+            await subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,68 @@
+"""
+Campus Connect - Renderers
+
+`FastJSONRenderer` is the default JSON renderer. It encodes with orjson when
+it is installed, producing the same bytes as DRF's JSONRenderer: values orjson
+does not handle the same way (Decimal, datetime, lazy strings...) go through
+DRF's encoder. Without orjson, or for anything orjson refuses, it falls back
+to the stock renderer. The one difference is that a NaN or infinite float is
+sent as null where the stock renderer raises.
+
+`CompactJSONRenderer` sends lists as columns: the field names once, then one
+array of values per row, which roughly halves large tables such as grades and
+attendance. Clients opt in with `?format=compact` or by accepting
+`application/vnd.campusconnect.compact+json`.
+"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson when available"""
+
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            # Indented or ASCII-only output is left to the stock renderer
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except (orjson.JSONEncodeError, TypeError, ValueError):
+            # Integers over 64 bits, lone surrogates, or values DRF rejects with its own error
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays a JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def to_columns(rows):
+    """Turn a list of objects into {"fields": [...], "rows": [[...], ...]}"""
+    fields = list(rows[0]) if rows else []
+    return {'fields': fields, 'rows': [[row.get(name) for name in fields] for row in rows]}
+
+
+def compact(data):
+    if isinstance(data, list) and all(isinstance(row, dict) for row in data):
+        return to_columns(data)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        # Paginated: the envelope stays, the page becomes columns
+        return {**data, 'results': compact(data['results'])}
+    return data
+
+
+class CompactJSONRenderer(FastJSONRenderer):
+    media_type = 'application/vnd.campusconnect.compact+json'
+    format = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(compact(data), accepted_media_type, renderer_context)
@@ -0,0 +1,100 @@
+"""
+Campus Connect - Read replicas
+
+List endpoints (grades, attendance, files, timetables, search) read far more
+than anything writes. When a `replica` database is configured, reads made
+inside `replica_reads()` go to it and everything else stays on the primary:
+writes, reads inside a transaction, and reads outside such a block.
+
+A replica lags the primary by a moment, so a user who just wrote would not
+see their own change in the list they return to. After a successful write
+request a user is pinned to the primary for REPLICA_STICKY_SECONDS: the pin
+lives in the cache, so it holds whichever worker answers next.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def stick(user_id):
+    """Read `user_id`'s requests from the primary until the replica has caught up with their write"""
+    cache.set(sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id):
+    return cache.get(sticky_key(user_id)) is not None
+
+
+@contextmanager
+def replica_reads(user=None):
+    """
+    Route reads made in the block to the replica
+
+    Yields whether they do: not without a replica, nor when `user` wrote
+    within the sticky window.
+    """
+    use = replica_configured() and not (user is not None and user.is_authenticated and is_sticky(user.pk))
+    token = _replica_reads.set(use)
+    try:
+        yield use
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Sends reads made in `replica_reads()` to the replica; the primary keeps the rest"""
+
+    def db_for_read(self, model, **hints):
+        # Rows written by an open transaction exist only on the primary
+        if _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Even for instances that were read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both hold the same rows
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica copies the primary's schema through replication
+        return False if db == REPLICA else None
+
+
+class ReplicaStickinessMiddleware:
+    """Pins users to the primary after a write request succeeds; unused without a replica"""
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                stick(user.pk)
+        return response
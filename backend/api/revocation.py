@@ -0,0 +1,158 @@
+"""
+Campus Connect - Token revocation store
+
+Revoked token ids (JTIs) are stored in the RevokedToken table. Checking that
+table on every request would cost a query per call, so each process keeps:
+
+- a Bloom filter of every revoked JTI: a token it has never seen is answered
+  "not revoked" from memory, which is the answer for almost every request
+- a bounded LRU of exact answers for JTIs the filter matched, so a false
+  positive or a revoked token hits the database once
+
+Processes learn about revocations made elsewhere through a generation counter
+in the shared cache: when it moves, the rows added since the last load are
+read and added to the filter. Ids are handed out at insert but become visible
+at commit, so a row can appear below ids already read; rows revoked in the
+last SETTLE_TIME are read again on every sync until they are older.
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.001
+LRU_SIZE = 10_000
+GENERATION_KEY = 'revocation:generation'
+# Longer than any transaction writing a revocation is expected to stay open
+SETTLE_TIME = timedelta(minutes=1)
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false-positive rate"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationStore:
+    """Answers "is this JTI revoked" for one process"""
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, lru_size=LRU_SIZE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything loaded; the next check reloads from the table"""
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.answers = OrderedDict()
+        self.last_id = 0
+        self.generation = None
+
+    def _remember(self, jti, revoked):
+        self.answers[jti] = revoked
+        self.answers.move_to_end(jti)
+        while len(self.answers) > self.lru_size:
+            self.answers.popitem(last=False)
+
+    def _live_rows(self, after_id=0):
+        return list(
+            RevokedToken.objects.filter(id__gt=after_id, expires_at__gt=datetime.now(timezone.utc))
+            .order_by('id').values_list('id', 'jti', 'revoked_at')
+        )
+
+    def _sync(self):
+        """Load rows revoked since the last sync if any process revoked a token"""
+        generation = cache.get(GENERATION_KEY, 0)
+        if generation == self.generation:
+            return
+        rows = self._live_rows(self.last_id)
+        with self._lock:
+            if self.bloom.count + len(rows) > self.bloom.capacity:
+                # Past capacity the error rate climbs: rebuild from the live rows, sized to fit
+                rows = self._live_rows()
+                self.bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+                self.answers.clear()
+            settled = datetime.now(timezone.utc) - SETTLE_TIME
+            pending = False
+            for row_id, jti, revoked_at in rows:
+                if jti not in self.bloom:
+                    self.bloom.add(jti)
+                if self.answers.get(jti) is False:
+                    # Cached before the revocation reached this process
+                    del self.answers[jti]
+                # Stop at the first recent row: a lower id may still commit below the ones after it
+                pending = pending or revoked_at >= settled
+                if not pending:
+                    self.last_id = max(self.last_id, row_id)
+            self.generation = generation
+
+    def is_revoked(self, jti):
+        self._sync()
+        if jti not in self.bloom:
+            return False
+        with self._lock:
+            if jti in self.answers:
+                self.answers.move_to_end(jti)
+                return self.answers[jti]
+        revoked = RevokedToken.objects.filter(jti=jti).exists()
+        with self._lock:
+            self._remember(jti, revoked)
+        return revoked
+
+    def revoke(self, token):
+        """Store the JTI of a validated token until the token expires"""
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.bulk_create([RevokedToken(
+            jti=jti,
+            user_id=token.get(api_settings.USER_ID_CLAIM),
+            token_type=token[api_settings.TOKEN_TYPE_CLAIM],
+            expires_at=datetime.fromtimestamp(token['exp'], timezone.utc),
+        )], ignore_conflicts=True)
+        with self._lock:
+            self.bloom.add(jti)
+            self._remember(jti, True)
+        # Other processes must not sync before the row is visible to them
+        transaction.on_commit(bump_generation)
+
+
+def bump_generation():
+    if not cache.add(GENERATION_KEY, 1, None):
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Evicted between add and incr
+            cache.add(GENERATION_KEY, 1, None)
+
+
+store = RevocationStore()
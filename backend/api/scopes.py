@@ -0,0 +1,113 @@
+"""
+Campus Connect - Access scopes
+
+The courses, groups and course assignments a user may reach, resolved once
+per request and cached between requests so role-filtered views can filter
+with `course_id__in` instead of joining through course assignments.
+
+- a teacher reaches the assignments they teach, with their courses and groups
+- a student reaches their group, the courses assigned to it and its
+  assignments; the entry is shared by the whole group and keyed by it, so a
+  student changing group simply reads another entry
+- admins are not restricted and get no scope
+
+Entries are dropped by the signals in signals.py when course assignments or
+a group's courses change.
+"""
+
+from django.core.cache import cache
+from django.db.models import IntegerField, Value
+
+from .models import User, Group, CourseAssignment
+
+CACHE_TIMEOUT = 60 * 60
+
+
+class Scope:
+    """Ids a user may access; sets so views can test membership cheaply"""
+
+    def __init__(self, course_ids=(), group_ids=(), assignment_ids=()):
+        self.course_ids = frozenset(course_ids)
+        self.group_ids = frozenset(group_ids)
+        self.assignment_ids = frozenset(assignment_ids)
+
+    def __repr__(self):
+        return (
+            f'Scope(courses={sorted(self.course_ids)}, groups={sorted(self.group_ids)}, '
+            f'assignments={sorted(self.assignment_ids)})'
+        )
+
+
+def teacher_key(user_id):
+    return f'scope:teacher:{user_id}'
+
+
+def group_key(group_id):
+    return f'scope:group:{group_id}'
+
+
+def teacher_scope(user_id):
+    rows = list(CourseAssignment.objects.filter(teacher_id=user_id).values_list('id', 'course_id', 'group_id'))
+    return Scope(
+        course_ids={course_id for _, course_id, _ in rows},
+        group_ids={group_id for _, _, group_id in rows},
+        assignment_ids={assignment_id for assignment_id, _, _ in rows},
+    )
+
+
+def group_scope(group_id):
+    # Courses linked to the group and its assignments, read in one query
+    linked = (
+        Group.courses.through.objects.filter(group_id=group_id)
+        .annotate(assignment_id=Value(None, output_field=IntegerField()))
+        .values_list('course_id', 'assignment_id')
+    )
+    assigned = CourseAssignment.objects.filter(group_id=group_id).values_list('course_id', 'id')
+    rows = list(linked.union(assigned, all=True))
+    return Scope(
+        course_ids={course_id for course_id, _ in rows},
+        group_ids={group_id},
+        assignment_ids={assignment_id for _, assignment_id in rows if assignment_id is not None},
+    )
+
+
+def _cached(key, compute, *args):
+    scope = cache.get(key)
+    if scope is None:
+        scope = compute(*args)
+        cache.set(key, scope, CACHE_TIMEOUT)
+    return scope
+
+
+def get_scope(user):
+    """
+    Return the scope of `user`, or None when the user is not restricted
+
+    The result is memoized on the user object, which DRF keeps for the whole
+    request, so every lookup after the first is free.
+    """
+    if '_access_scope' in user.__dict__:
+        return user._access_scope
+
+    if user.role == User.TEACHER:
+        scope = _cached(teacher_key(user.id), teacher_scope, user.id)
+    elif user.role == User.STUDENT:
+        scope = _cached(group_key(user.group_id), group_scope, user.group_id) if user.group_id else Scope()
+    else:
+        scope = None
+
+    user._access_scope = scope
+    return scope
+
+
+def forget_scope(user):
+    """Drop the scope memoized on a user object"""
+    user.__dict__.pop('_access_scope', None)
+
+
+def invalidate_teachers(*user_ids):
+    cache.delete_many([teacher_key(user_id) for user_id in user_ids if user_id])
+
+
+def invalidate_groups(*group_ids):
+    cache.delete_many([group_key(group_id) for group_id in group_ids if group_id])
@@ -0,0 +1,106 @@
+"""
+Campus Connect - Search
+
+User and course search. On PostgreSQL every word typed is matched as a
+prefix against a weighted full-text document of the row, so "jea mar" finds
+Jean Martin, and results are ranked: a match on a name comes before one on a
+username, which comes before one on an email or student ID. A GIN index over
+each document keeps every keystroke of the "new chat" box off a sequential
+scan. Other databases keep DRF's icontains search.
+
+The indexes are created after `migrate` (see create_search_indexes) rather
+than declared on the models, whose indexes must build on SQLite too.
+"""
+
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Value
+from django.db.models.functions import Replace
+from rest_framework import filters
+
+from .models import User, Course
+
+CONFIG = 'simple'
+
+
+def words(field):
+    """`field` with '@' and '.' as spaces, so emails and dotted usernames index word by word"""
+    return Replace(Replace(field, Value('@'), Value(' ')), Value('.'), Value(' '))
+
+
+# 'simple' keeps names as written: no stemming, no stop words
+USER_SEARCH_VECTOR = (
+    SearchVector('first_name', 'last_name', config=CONFIG, weight='A')
+    + SearchVector(words('username'), config=CONFIG, weight='B')
+    + SearchVector(words('email'), 'student_id', config=CONFIG, weight='C')
+)
+COURSE_SEARCH_VECTOR = (
+    SearchVector('code', config=CONFIG, weight='A')
+    + SearchVector('name', config=CONFIG, weight='B')
+)
+
+SEARCH_INDEXES = {
+    User: GinIndex(USER_SEARCH_VECTOR, name='user_search_idx'),
+    Course: GinIndex(COURSE_SEARCH_VECTOR, name='course_search_idx'),
+}
+
+# Letters and digits: PostgreSQL's parser splits words on everything else, '_' included
+WORD = re.compile(r'[^\W_]+')
+
+
+def prefix_tsquery(terms):
+    """tsquery source matching a word starting with every word of `terms`; empty if there are none"""
+    return ' & '.join(f"'{word.lower()}':*" for term in terms for word in WORD.findall(term))
+
+
+def prefix_query(terms):
+    raw = prefix_tsquery(terms)
+    return SearchQuery(raw, config=CONFIG, search_type='raw') if raw else None
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter ranking prefix matches of the view's `search_vector` on PostgreSQL
+
+    Views without a `search_vector`, and other databases, get the plain
+    SearchFilter over `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        vector = getattr(view, 'search_vector', None)
+        terms = self.get_search_terms(request)
+        if vector is None or not terms or connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        query = prefix_query(terms)
+        if query is None:
+            return queryset.none()
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return (
+            queryset.annotate(search_rank=SearchRank(vector, query))
+            .alias(search_document=vector)
+            .filter(search_document=query)
+            .order_by('-search_rank', *ordering)
+        )
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS):
+    """Build the search indexes missing from `using`; returns their names"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return []
+    created = []
+    for model, index in SEARCH_INDEXES.items():
+        if not router.allow_migrate_model(using, model):
+            continue
+        with connection.cursor() as cursor:
+            if index.name in connection.introspection.get_constraints(cursor, model._meta.db_table):
+                continue
+        # Concurrently, so a deploy onto a large table does not block writes meanwhile
+        with connection.schema_editor(atomic=False) as editor:
+            editor.execute(index.create_sql(model, editor, concurrently=True), params=None)
+        created.append(index.name)
+    return created
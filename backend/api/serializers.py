@@ -2,17 +2,176 @@
 
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Prefetch
+from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession, Conversation
+from .profiling import TimedSerializerMixin
 
 
-
-
-class UserSerializer(serializers.ModelSerializer):
+class EagerLoadingMixin(TimedSerializerMixin):
+    """
+    Declares the relations a serializer reads so list views can load them up front
+    
+    `select_related_fields` and `prefetch_related_fields` mirror the arguments of
+    `select_related()` / `prefetch_related()` (Prefetch objects are allowed).
+    `annotated_fields` maps attribute names to aggregate expressions computed
+    in the same query, e.g. counts that would otherwise cost one query per row.
+    
+    Views may serialize a sparse fieldset (see EagerLoadingViewMixin): only the
+    names in `context['sparse_fields']` are kept, and only what they read is
+    loaded. What a field reads comes from its `source`; `field_sources` gives
+    the dotted paths read by fields whose source says nothing useful, such as
+    method fields or `get_full_name`.
+    
+    Serializing is timed for the profiling middleware (see profiling.py).
+    """
+    
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    annotated_fields = {}
+    field_sources = {}
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('sparse_fields')
+        root = self.root
+        is_item = self is root or (self.parent is root and isinstance(root, serializers.ListSerializer))
+        if selected is not None and is_item:
+            # Nested serializers keep their fields, write-only ones are never sent anyway
+            fields = {name: field for name, field in fields.items() if name in selected or field.write_only}
+        return fields
+    
+    @classmethod
+    def readable_fields(cls):
+        return [name for name, field in cls().fields.items() if not field.write_only]
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, columns=()):
+        """
+        Apply the declared loading to `queryset`
+        
+        With `fields`, the names of a sparse fieldset, only the relations and
+        annotations those fields read are applied and the row is narrowed with
+        `.only()` to their columns plus `columns`. When a field's reads cannot
+        be worked out everything is loaded as without `fields`.
+        """
+        select_related = cls.select_related_fields
+        prefetch_related = cls.prefetch_related_fields
+        annotated = cls.annotated_fields
+        plan = cls.loading_plan(queryset.model, fields) if fields is not None else None
+        if plan is not None:
+            paths, relations, annotations = plan
+            # A relation cannot be both deferred and followed: cut each join at the last used level
+            select_related = set()
+            for lookup in cls.select_related_fields:
+                parts = lookup.split('__')
+                used = [i for i in range(1, len(parts) + 1) if '__'.join(parts[:i]) in relations]
+                if used:
+                    select_related.add('__'.join(parts[:max(used)]))
+            prefetch_related = [
+                lookup for lookup in cls.prefetch_related_fields
+                if any(
+                    relation == prefetch_path or relation.startswith(prefetch_path + '__')
+                    for prefetch_path in [getattr(lookup, 'prefetch_to', lookup)]
+                    for relation in relations
+                )
+            ]
+            annotated = {name: value for name, value in cls.annotated_fields.items() if name in annotations}
+        
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if annotated:
+            # Aggregates add a GROUP BY, which drops Meta.ordering unless it is explicit
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+            queryset = queryset.annotate(**annotated).order_by(*ordering)
+        if plan is not None:
+            queryset = queryset.only(*paths, *columns)
+        return queryset
+    
+    @classmethod
+    def loading_plan(cls, model, fields):
+        """
+        Return (only() paths, relation paths, annotations) read by `fields`,
+        or None when some field reads something other than model fields
+        """
+        declared = cls().fields
+        paths, relations, annotations = {model._meta.pk.name}, set(), set()
+        for name in fields:
+            nested = getattr(declared[name], 'child', declared[name])
+            if isinstance(nested, serializers.BaseSerializer):
+                nested_plan = cls.nested_loading_plan(model, declared[name].source, nested)
+                if nested_plan is None:
+                    return None
+                paths |= nested_plan[0]
+                relations |= nested_plan[1]
+                continue
+            sources = cls.field_sources.get(name) or declared[name].source
+            if sources == '*':
+                return None
+            for source in [sources] if isinstance(sources, str) else sources:
+                current, prefix = model, ''
+                for position, part in enumerate(source.split('.')):
+                    if not prefix and part in cls.annotated_fields:
+                        annotations.add(part)
+                        break
+                    try:
+                        field = current._meta.get_field(part)
+                    except FieldDoesNotExist:
+                        field = next((f for f in current._meta.concrete_fields if f.attname == part), None)
+                    if field is None:
+                        if not prefix:
+                            return None
+                        # A method of a related row, which then needs all of it
+                        paths.add(prefix[:-2])
+                        break
+                    path = prefix + field.name
+                    if field.many_to_many or field.one_to_many or not field.concrete:
+                        # Reverse and many-to-many relations are prefetched, the row only needs its pk
+                        relations.add(path)
+                        break
+                    if field.is_relation and position < source.count('.'):
+                        relations.add(path)
+                        current, prefix = field.related_model, path + '__'
+                        continue
+                    paths.add(path)
+                    break
+        return paths, relations, annotations
+    
+    @classmethod
+    def nested_loading_plan(cls, model, source, nested):
+        """
+        Return (only() paths, relation paths) of this row read by the nested
+        serializer of relation `source`, or None when they cannot be worked out
+
+        A prefetched reverse relation points each related row back at this one,
+        so what the nested serializer reads through that link is loaded here.
+        """
+        if not isinstance(nested, EagerLoadingMixin) or '.' in source:
+            return None
+        relation = model._meta.get_field(source)
+        if not relation.one_to_many:
+            # Forward relations are joined and read whole; many-to-many rows only need this pk
+            return (set(), {source}) if relation.many_to_many else None
+        plan = type(nested).loading_plan(relation.related_model, type(nested).readable_fields())
+        if plan is None:
+            return None
+        back = relation.field.name + '__'
+        paths = {path.removeprefix(back) for path in plan[0] if path.startswith(back)}
+        relations = {path.removeprefix(back) for path in plan[1] if path.startswith(back)}
+        return paths, relations | {source}
+
+
+class UserSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     # Include group details when serializing
     group_name = serializers.SerializerMethodField()
     group_id = serializers.SerializerMethodField()
     
+    select_related_fields = ('group',)
+    field_sources = {'group_name': 'group.name', 'group_id': 'group.id'}
+    
     class Meta:
         model = User
         fields = [
@@ -30,9 +189,11 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.group.id if obj.group else None
 
 
-class UserSearchSerializer(serializers.ModelSerializer):
+class UserSearchSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
 
+    field_sources = {'full_name': ('first_name', 'last_name', 'username')}
+
     class Meta:
         model = User
         fields = ['id', 'username', 'full_name', 'role', 'profile_picture']
@@ -104,7 +265,7 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     class Meta:
         model = Course
@@ -118,7 +279,7 @@ class CourseCreateSerializer(serializers.ModelSerializer):
         fields = ['code', 'name', 'description', 'credits']
 
 
-class ScheduleSessionSerializer(serializers.ModelSerializer):
+class ScheduleSessionSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     assignment_id = serializers.PrimaryKeyRelatedField(
         queryset=CourseAssignment.objects.all(), source='assignment', write_only=True
     )
@@ -127,6 +288,14 @@ class ScheduleSessionSerializer(serializers.ModelSerializer):
     group_name = serializers.SerializerMethodField()
     teacher_name = serializers.SerializerMethodField()
     
+    select_related_fields = ('assignment__course', 'assignment__group', 'assignment__teacher')
+    field_sources = {
+        'course_code': 'assignment.course.code',
+        'course_name': 'assignment.course.name',
+        'group_name': 'assignment.group.name',
+        'teacher_name': ('assignment.teacher.first_name', 'assignment.teacher.last_name'),
+    }
+    
     class Meta:
         model = ScheduleSession
         fields = [
@@ -147,7 +316,7 @@ class ScheduleSessionSerializer(serializers.ModelSerializer):
     def get_teacher_name(self, obj):
         return obj.assignment.teacher.get_full_name() if obj.assignment and obj.assignment.teacher else None
 
-class CourseAssignmentSerializer(serializers.ModelSerializer):
+class CourseAssignmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     teacher_name = serializers.CharField(source='teacher.get_full_name', read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
@@ -155,6 +324,10 @@ class CourseAssignmentSerializer(serializers.ModelSerializer):
     group_id = serializers.PrimaryKeyRelatedField(source='group', read_only=True)
     sessions = ScheduleSessionSerializer(many=True, read_only=True)
 
+    select_related_fields = ('teacher', 'course', 'group')
+    prefetch_related_fields = ('sessions',)
+    field_sources = {'teacher_name': ('teacher.first_name', 'teacher.last_name')}
+
     class Meta:
         model = CourseAssignment
         fields = [
@@ -168,17 +341,23 @@ class CourseAssignmentSerializer(serializers.ModelSerializer):
 # GROUP SERIALIZERS
 # ============================================================================
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     student_count = serializers.SerializerMethodField()
     courses = CourseSerializer(many=True, read_only=True)
     
+    prefetch_related_fields = ('courses',)
+    annotated_fields = {'student_count': Count('students')}
+    field_sources = {'student_count': 'student_count'}
+    
     class Meta:
         model = Group
         fields = ['id', 'name', 'academic_year', 'student_count', 'courses']
     
     def get_student_count(self, obj):
-        """Count students in this group"""
+        """Count students in this group (annotated by list and detail views)"""
+        if hasattr(obj, 'student_count'):
+            return obj.student_count
         return obj.students.count()
 
 
@@ -186,7 +365,7 @@ class GroupSerializer(serializers.ModelSerializer):
 # GRADE SERIALIZERS
 # ============================================================================
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     course_code = serializers.CharField(source='course.code', read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
@@ -194,6 +373,9 @@ class GradeSerializer(serializers.ModelSerializer):
     student_id = serializers.CharField(source='student.student_id', read_only=True)
     average = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)
     
+    select_related_fields = ('student', 'course')
+    field_sources = {'student_name': ('student.first_name', 'student.last_name')}
+    
     class Meta:
         model = Grade
         fields = [
@@ -212,16 +394,33 @@ class GradeUpdateSerializer(serializers.ModelSerializer):
         fields = ['td_mark', 'tp_mark', 'exam_mark', 'comments']
 
 
+class GradebookRowSerializer(serializers.Serializer):
+    """
+    One student's changed marks in a gradebook save
+    
+    `updated_at` is the version the client edited; marks left out keep their value.
+    """
+    
+    student = serializers.IntegerField()
+    updated_at = serializers.DateTimeField(input_formats=['iso-8601'])
+    td_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, allow_null=True, required=False)
+    tp_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, allow_null=True, required=False)
+    exam_mark = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=20, allow_null=True, required=False)
+
+
 # ============================================================================
 # ATTENDANCE SERIALIZERS
 # ============================================================================
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
     student_id = serializers.CharField(source='student.student_id', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
     
+    select_related_fields = ('student', 'course')
+    field_sources = {'student_name': ('student.first_name', 'student.last_name')}
+    
     class Meta:
         model = Attendance
         fields = [
@@ -231,15 +430,28 @@ class AttendanceSerializer(serializers.ModelSerializer):
         ]
 
 
+class BulkAttendanceRecordSerializer(serializers.Serializer):
+    """One roll-call entry of a bulk attendance payload"""
+    
+    student = serializers.IntegerField()
+    course = serializers.IntegerField()
+    week_number = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Attendance.STATUS_CHOICES)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
 # ============================================================================
 # FILE SERIALIZERS
 # ============================================================================
 
-class CourseFileSerializer(serializers.ModelSerializer):
+class CourseFileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     uploaded_by_name = serializers.CharField(source='uploaded_by.get_full_name', read_only=True)
     course_code = serializers.CharField(source='course.code', read_only=True)
     
+    select_related_fields = ('uploaded_by', 'course')
+    field_sources = {'uploaded_by_name': ('uploaded_by.first_name', 'uploaded_by.last_name')}
+    
     class Meta:
         model = CourseFile
         fields = [
@@ -254,10 +466,12 @@ class CourseFileSerializer(serializers.ModelSerializer):
 # TIMETABLE SERIALIZERS
 # ============================================================================
 
-class TimetableSerializer(serializers.ModelSerializer):
+class TimetableSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     group_name = serializers.CharField(source='group.name', read_only=True)
     
+    select_related_fields = ('group',)
+    
     class Meta:
         model = Timetable
         fields = [
@@ -270,11 +484,15 @@ class TimetableSerializer(serializers.ModelSerializer):
 # NESTED SERIALIZERS FOR COMPLEX DATA
 # ============================================================================
 
-class StudentDetailSerializer(serializers.ModelSerializer):
+class StudentDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     group_name = serializers.SerializerMethodField()
     grade_count = serializers.SerializerMethodField()
     
+    select_related_fields = ('group',)
+    annotated_fields = {'grade_count': Count('grades')}
+    field_sources = {'group_name': 'group.name', 'grade_count': 'grade_count'}
+    
     class Meta:
         model = User
         fields = [
@@ -289,14 +507,25 @@ class StudentDetailSerializer(serializers.ModelSerializer):
     
     def get_grade_count(self, obj):
         """How many courses this student has grades for"""
+        if hasattr(obj, 'grade_count'):
+            return obj.grade_count
         return obj.grades.count()
 
 
-class TeacherDetailSerializer(serializers.ModelSerializer):
+class TeacherDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     
     courses = CourseAssignmentSerializer(source='teaching_assignments', many=True, read_only=True)
     course_count = serializers.SerializerMethodField()
     
+    prefetch_related_fields = (
+        Prefetch(
+            'teaching_assignments',
+            queryset=CourseAssignmentSerializer.setup_eager_loading(CourseAssignment.objects.all())
+        ),
+    )
+    annotated_fields = {'course_count': Count('teaching_assignments')}
+    field_sources = {'course_count': 'course_count'}
+    
     class Meta:
         model = User
         fields = [
@@ -306,6 +535,8 @@ class TeacherDetailSerializer(serializers.ModelSerializer):
     
     def get_course_count(self, obj):
         """Number of courses this teacher is teaching"""
+        if hasattr(obj, 'course_count'):
+            return obj.course_count
         return obj.teaching_assignments.count()
 
 
@@ -313,10 +544,16 @@ class TeacherDetailSerializer(serializers.ModelSerializer):
 # INTERACTION SERIALIZERS (Messages & Notifications)
 # ============================================================================
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     sender_name = serializers.SerializerMethodField()
     receiver_name = serializers.SerializerMethodField()
 
+    select_related_fields = ('sender', 'receiver')
+    field_sources = {
+        'sender_name': ('sender.first_name', 'sender.last_name', 'sender.username'),
+        'receiver_name': ('receiver.first_name', 'receiver.last_name', 'receiver.username'),
+    }
+
     class Meta:
         model = Message
         fields = ['id', 'sender', 'sender_name', 'receiver', 'receiver_name', 'content', 'timestamp', 'is_read']
@@ -331,7 +568,29 @@ class MessageSerializer(serializers.ModelSerializer):
         return name if name else obj.receiver.username
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    peer_name = serializers.SerializerMethodField()
+    peer_role = serializers.CharField(source='peer.role', read_only=True)
+    peer_picture = serializers.ImageField(source='peer.profile_picture', read_only=True)
+    last_message = serializers.CharField(source='last_message.content', read_only=True, default=None)
+    last_sender = serializers.IntegerField(source='last_message.sender_id', read_only=True, default=None)
+
+    select_related_fields = ('peer', 'last_message')
+    field_sources = {'peer_name': ('peer.first_name', 'peer.last_name', 'peer.username')}
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'peer', 'peer_name', 'peer_role', 'peer_picture',
+            'last_message', 'last_sender', 'last_timestamp', 'unread_count'
+        ]
+
+    def get_peer_name(self, obj):
+        name = obj.peer.get_full_name().strip()
+        return name if name else obj.peer.username
+
+
+class NotificationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'user', 'title', 'message', 'notification_type', 'created_at', 'is_read']
@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import authentication, badges, catalog, realtime, scopes, search
+from .models import (
+    User, Course, Group, Grade, Attendance, Timetable, CourseAssignment, ScheduleSession, Message, Notification,
+)
+from .serializers import MessageSerializer, NotificationSerializer
+
+
+@receiver(post_save, sender=CourseAssignment)
+def provision_assignment_grades(sender, instance, **kwargs):
+    """Give every student of the group a grade row for the assigned course"""
+    student_ids = User.objects.filter(
+        role=User.STUDENT, group_id=instance.group_id
+    ).values_list('id', flat=True)
+    Grade.provision(student_ids, [instance.course_id])
+
+
+@receiver(post_save, sender=User)
+def provision_student_grades(sender, instance, created, **kwargs):
+    """Give a student joining a group a grade row for each of its assigned courses"""
+    group_id = instance.group_id
+    previous_group_id = getattr(instance, '_loaded_group_id', None)
+    instance._loaded_group_id = group_id
+
+    if group_id != previous_group_id:
+        scopes.forget_scope(instance)
+        bump_catalog(catalog.GROUP_STUDENTS)
+
+    if instance.role != User.STUDENT or not group_id:
+        return
+    if not created and group_id == previous_group_id:
+        return
+
+    course_ids = CourseAssignment.objects.filter(group_id=group_id).values_list('course_id', flat=True)
+    Grade.provision([instance.id], course_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_token_version(sender, instance, **kwargs):
+    """Make the next request read the user's token version again"""
+    authentication.forget_token_version(instance.pk)
+    transaction.on_commit(lambda: authentication.forget_token_version(instance.pk))
+
+
+@receiver(post_save, sender=CourseAssignment)
+@receiver(post_delete, sender=CourseAssignment)
+def invalidate_assignment_scopes(sender, instance, **kwargs):
+    """Refresh the teachers and groups on both sides of a changed assignment"""
+    teacher_ids = {instance.teacher_id, getattr(instance, '_loaded_teacher_id', None)}
+    group_ids = {instance.group_id, getattr(instance, '_loaded_group_id', None)}
+    instance._loaded_teacher_id = instance.teacher_id
+    instance._loaded_group_id = instance.group_id
+
+    def invalidate():
+        scopes.invalidate_teachers(*teacher_ids)
+        scopes.invalidate_groups(*group_ids)
+
+    invalidate()
+    # Again once committed, a concurrent request may have cached the old rows meanwhile
+    transaction.on_commit(invalidate)
+
+
+@receiver(m2m_changed, sender=Group.courses.through)
+def invalidate_group_course_scopes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        group_ids = [instance.pk]
+    elif action == 'pre_clear':
+        group_ids = list(instance.groups.values_list('id', flat=True))
+    else:
+        group_ids = list(pk_set)
+    scopes.invalidate_groups(*group_ids)
+    transaction.on_commit(lambda: scopes.invalidate_groups(*group_ids))
+
+
+def bump_catalog(*names):
+    catalog.bump(*names)
+    # Again once committed, a concurrent request may have cached the old rows meanwhile
+    transaction.on_commit(lambda: catalog.bump(*names))
+
+
+CATALOG_MODELS = {
+    Course: catalog.COURSES,
+    Group: catalog.GROUPS,
+    CourseAssignment: catalog.ASSIGNMENTS,
+    ScheduleSession: catalog.SCHEDULES,
+    Timetable: catalog.TIMETABLES,
+}
+
+# Rows shown on their owner's dashboard: model -> owner id field
+USER_RECORD_MODELS = {
+    User: 'id',
+    Grade: 'student_id',
+    Attendance: 'student_id',
+    Notification: 'user_id',
+    Message: 'receiver_id',
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_catalog_version(sender, instance, **kwargs):
+    if sender in CATALOG_MODELS:
+        bump_catalog(CATALOG_MODELS[sender])
+    elif sender in USER_RECORD_MODELS:
+        bump_catalog(catalog.user_records(getattr(instance, USER_RECORD_MODELS[sender])))
+
+
+@receiver(m2m_changed, sender=Group.courses.through)
+def bump_group_courses_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog(catalog.GROUP_COURSES)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_catalog_versions(sender, instance, signal, **kwargs):
+    """Teacher names appear in schedules; group changes are handled with grade provisioning"""
+    if instance.role == User.TEACHER:
+        bump_catalog(catalog.TEACHERS)
+    if signal is post_delete and instance.group_id:
+        bump_catalog(catalog.GROUP_STUDENTS)
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: badges.notification_created(instance))
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: badges.message_created(instance))
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: push_notification(instance))
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: push_message(instance))
+
+
+def push_notification(notification):
+    realtime.publish(notification.user_id, 'notification', NotificationSerializer(notification).data)
+
+
+def push_message(message):
+    # Both sides get the event so the sender's other devices update as well
+    payload = MessageSerializer(message).data
+    realtime.publish(message.receiver_id, 'message', payload)
+    realtime.publish(message.sender_id, 'message', payload)
+
+
+@receiver(post_delete, sender=Notification)
+def forget_notification_counts(sender, instance, **kwargs):
+    transaction.on_commit(lambda: badges.forget_unread_counts(instance.user_id))
+
+
+@receiver(post_delete, sender=Message)
+def forget_message_counts(sender, instance, **kwargs):
+    transaction.on_commit(lambda: badges.forget_unread_counts(instance.receiver_id))
+
+
+@receiver(post_migrate)
+def build_search_indexes(sender, using, verbosity, stdout=None, **kwargs):
+    if sender.name != 'api':
+        return
+    for name in search.create_search_indexes(using):
+        # `migrate` passes its own output, so --verbosity and redirected output apply
+        if verbosity >= 1 and stdout is not None:
+            stdout.write(f'  Created search index {name}\n')
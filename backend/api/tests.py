@@ -1,3 +1,1570 @@
-from django.test import TestCase
+"""
+Campus Connect - API Tests
+"""
 
-# Create your tests here.
+import asyncio
+import io
+import json
+import re
+from contextlib import contextmanager
+from datetime import time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, connections, transaction
+from django.db.models import QuerySet
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import benchmarks, checks, database, profiling, realtime, replicas, revocation, search, renderers, scopes, urls as api_urls, views
+from .authentication import CampusRefreshToken, user_from_token
+from .benchmarks import ROUTE_BUDGETS, STREAMING_ROUTES, WRITE_ONLY_ROUTES
+from .parsers import FastJSONParser
+from .revocation import BloomFilter, RevocationStore, store as revocation_store
+from .serializers import AttendanceSerializer, GradeSerializer
+from .models import (
+    User, Course, Group, Grade, Attendance, CourseFile, Timetable,
+    CourseAssignment, Message, Notification, ScheduleSession, Conversation, RevokedToken,
+)
+
+
+class QueryBudgetMixin:
+    """Assertion helpers for keeping endpoints within a query budget"""
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, label=''):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > max_queries:
+            queries = '\n'.join(query['sql'] for query in context.captured_queries)
+            self.fail(f'{label} ran {executed} queries, budget is {max_queries}:\n{queries}')
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, f'{url} -> {response.status_code}')
+        return len(context.captured_queries)
+
+
+class CampusFixtureMixin:
+    """Builds a small campus that can be grown to check per-row query costs"""
+
+    def build_campus(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin', role=User.ADMIN, is_approved=True)
+        self.teacher = User.objects.create_user('teacher', role=User.TEACHER, is_approved=True)
+        self.group = Group.objects.create(name='G1', academic_year='2025-2026')
+        self.student = User.objects.create_user(
+            'student', role=User.STUDENT, is_approved=True,
+            student_id='S0', group=self.group
+        )
+        self.rounds = 0
+        self.grow_campus()
+
+    def grow_campus(self, size=3):
+        """Add `size` rows to every table the list endpoints read"""
+        for _ in range(size):
+            self.rounds += 1
+            n = self.rounds
+            course = Course.objects.create(code=f'C{n}', name=f'Course {n}')
+            self.group.courses.add(course)
+            peer = User.objects.create_user(
+                f'student{n}', role=User.STUDENT, is_approved=n % 2 == 0,
+                student_id=f'S{n}', group=self.group, first_name='Student', last_name=str(n)
+            )
+            assignment = CourseAssignment.objects.create(
+                teacher=self.teacher, course=course, group=self.group, academic_year='2025-2026'
+            )
+            ScheduleSession.objects.create(
+                assignment=assignment, day='MONDAY', start_time=time(8), end_time=time(10), room=f'R{n}'
+            )
+            for student in (self.student, peer):
+                Attendance.objects.create(student=student, course=course, week_number=1)
+            CourseFile.objects.create(
+                course=course, uploaded_by=self.teacher, title=f'File {n}', file=f'course_files/{n}.pdf'
+            )
+            Timetable.objects.create(
+                group=self.group, title=f'Timetable {n}', image=f'timetables/{n}.png', academic_year='2025-2026'
+            )
+            Conversation.record(Message.objects.create(sender=self.teacher, receiver=self.student, content=f'Hello {n}'))
+            Conversation.record(Message.objects.create(sender=peer, receiver=self.student, content=f'Hi {n}'))
+            Notification.objects.create(user=self.student, title=f'Note {n}', message='...')
+            User.objects.create_user(f'teacher{n}', role=User.TEACHER, is_approved=True)
+            Group.objects.create(name=f'G{n + 1}', academic_year='2025-2026').courses.add(course)
+        self.assignment = assignment
+        self.course = course
+        self.session = ScheduleSession.objects.filter(assignment=assignment).first()
+
+
+class RouteQueryBudgetTests(QueryBudgetMixin, CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+
+    def route_kwargs(self, name):
+        return {
+            'course-detail': {'pk': self.course.pk},
+            'group-detail': {'pk': self.group.pk},
+            'assignment-detail': {'pk': self.assignment.pk},
+            'course-grades': {'course_id': self.assignment.pk},
+            'gradebook': {'assignment_id': self.assignment.pk},
+            'file-detail': {'pk': CourseFile.objects.last().pk},
+            'timetable-detail': {'pk': Timetable.objects.last().pk},
+            'schedule-detail': {'pk': self.session.pk},
+        }.get(name, {})
+
+    def client_for(self, role):
+        # A fresh user per client, as each request loads its own
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=getattr(self, role).pk))
+        return client
+
+    def test_every_route_has_a_budget(self):
+        names = {pattern.name for pattern in api_urls.urlpatterns}
+        missing = names - set(ROUTE_BUDGETS) - WRITE_ONLY_ROUTES - STREAMING_ROUTES
+        self.assertFalse(missing, f'Routes without a query budget: {sorted(missing)}')
+
+    def test_routes_stay_within_budget(self):
+        for name, (role, budget, _) in ROUTE_BUDGETS.items():
+            with self.subTest(route=name):
+                url = reverse(name, kwargs=self.route_kwargs(name))
+                client = self.client_for(role)
+                with self.assertMaxQueries(budget, label=url):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = {
+            name: (role, reverse(name, kwargs=self.route_kwargs(name)))
+            for name, (role, _, _) in ROUTE_BUDGETS.items()
+        }
+        # Compare cold requests: cached responses would hide per-row queries
+        cache.clear()
+        before = {name: self.count_queries(self.client_for(role), url) for name, (role, url) in urls.items()}
+        self.grow_campus(size=6)
+        cache.clear()
+        after = {name: self.count_queries(self.client_for(role), url) for name, (role, url) in urls.items()}
+        self.assertEqual(before, after)
+
+
+class GradeProvisioningTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.course_ids = set(CourseAssignment.objects.filter(group=self.group).values_list('course_id', flat=True))
+
+    def grade_courses(self, student):
+        return set(Grade.objects.filter(student=student).values_list('course_id', flat=True))
+
+    def test_assignment_gives_every_group_student_a_row(self):
+        course = Course.objects.create(code='NEW', name='New course')
+        CourseAssignment.objects.create(teacher=self.teacher, course=course, group=self.group, academic_year='2024-2025')
+        students = User.objects.filter(role=User.STUDENT, group=self.group)
+        self.assertEqual(Grade.objects.filter(course=course).count(), students.count())
+        self.assertFalse(Grade.objects.filter(course=course, student=self.teacher).exists())
+
+    def test_student_joining_a_group_gets_its_courses(self):
+        newcomer = User.objects.create_user('newcomer', role=User.STUDENT, group=self.group)
+        self.assertEqual(self.grade_courses(newcomer), self.course_ids)
+
+        other = Group.objects.get(name='G2')
+        course = Course.objects.create(code='OTHER', name='Other course')
+        CourseAssignment.objects.create(teacher=self.teacher, course=course, group=other, academic_year='2025-2026')
+        moved = User.objects.get(pk=newcomer.pk)
+        moved.group = other
+        moved.save()
+        # Rows of the old group are kept: they hold the marks already given
+        self.assertEqual(self.grade_courses(moved), self.course_ids | {course.id})
+
+    def test_leaving_a_group_keeps_the_rows(self):
+        student = User.objects.get(pk=self.student.pk)
+        student.group = None
+        student.save()
+        self.assertEqual(self.grade_courses(student), self.course_ids)
+
+    def test_teachers_get_no_rows(self):
+        User.objects.create_user('grouped-teacher', role=User.TEACHER, group=self.group)
+        self.assertFalse(Grade.objects.filter(student__username='grouped-teacher').exists())
+
+    def test_provisioning_is_idempotent(self):
+        before = Grade.objects.count()
+        student_ids = list(User.objects.filter(group=self.group).values_list('id', flat=True))
+        with self.assertNumQueries(1):
+            self.assertEqual(Grade.provision(student_ids, self.course_ids), [])
+        CourseAssignment.objects.filter(group=self.group).first().save()
+        self.assertEqual(Grade.objects.count(), before)
+
+    def test_command_backfills_assignments_made_before_provisioning(self):
+        expected = set(Grade.objects.values_list('student_id', 'course_id'))
+        Grade.objects.all().delete()
+        out = io.StringIO()
+        call_command('provision_grades', stdout=out)
+        self.assertEqual(set(Grade.objects.values_list('student_id', 'course_id')), expected)
+        self.assertIn(f'Created {len(expected)} missing grade row(s)', out.getvalue())
+
+        call_command('provision_grades', stdout=out)
+        self.assertEqual(Grade.objects.count(), len(expected))
+
+
+class BulkAttendanceTests(QueryBudgetMixin, CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = reverse('attendance-bulk')
+
+    def roll_call(self, students, week, status='PRESENT'):
+        return [
+            {'student': student.id, 'course': self.course.id, 'week_number': week, 'status': status}
+            for student in students
+        ]
+
+    def test_creates_and_updates_in_one_request(self):
+        peer = User.objects.get(username=f'student{self.rounds}')
+        response = self.client.post(self.url, {'attendance': [
+            # week 1 rows exist from the fixture, week 5 does not
+            *self.roll_call([self.student, peer], 1, 'ABSENT'),
+            *self.roll_call([self.student], 5, 'LATE'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual([row['status'] for row in response.data['results']], ['ABSENT', 'ABSENT', 'LATE'])
+        rows = Attendance.objects.filter(course=self.course)
+        self.assertEqual(
+            set(rows.values_list('student__username', 'week_number', 'status')),
+            {('student', 1, 'ABSENT'), (peer.username, 1, 'ABSENT'), ('student', 5, 'LATE')},
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def queries(count, week):
+            students = User.objects.bulk_create([
+                User(username=f'roll{week}_{n}', role=User.STUDENT, is_approved=True, group=self.group)
+                for n in range(count)
+            ])
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(self.url, {'attendance': self.roll_call(students, week)}, format='json')
+            self.assertEqual(len(response.data['results']), count)
+            return len(context.captured_queries)
+
+        queries(1, 6)  # caches the teacher's scope
+        self.assertEqual(queries(2, 7), queries(20, 8))
+
+
+class GradeAverageTests(CampusFixtureMixin, TestCase):
+    """The stored average must equal the property it replaced, rounded to the column's two places"""
+
+    MARKS = [
+        (None, None, None), (Decimal('12'), None, None), (None, Decimal('12.5'), Decimal('13')),
+        (Decimal('10'), Decimal('11'), Decimal('12.25')), (Decimal('7.33'), Decimal('8.01'), Decimal('19.99')),
+        (Decimal('0'), Decimal('0'), Decimal('1')),
+    ]
+
+    def setUp(self):
+        self.build_campus()
+        students = User.objects.bulk_create([
+            User(username=f'avg{n}', role=User.STUDENT) for n in range(len(self.MARKS))
+        ])
+        Grade.provision([student.id for student in students], [self.course.id])
+        self.grades = list(Grade.objects.filter(student__in=students).order_by('student__username'))
+
+    @staticmethod
+    def legacy_average(marks):
+        # The computed property Grade.average used to be
+        marks = [mark for mark in marks if mark is not None]
+        if not marks:
+            return None
+        return (sum(marks) / len(marks)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def assertAverages(self):
+        for grade, marks in zip(self.grades, self.MARKS):
+            grade.refresh_from_db()
+            self.assertEqual(grade.average, self.legacy_average(marks), marks)
+
+    def set_marks(self, grade, marks):
+        grade.td_mark, grade.tp_mark, grade.exam_mark = marks
+
+    def test_save(self):
+        for grade, marks in zip(self.grades, self.MARKS):
+            self.set_marks(grade, marks)
+            grade.save()
+        self.assertAverages()
+
+    def test_save_with_update_fields(self):
+        for grade, marks in zip(self.grades, self.MARKS):
+            self.set_marks(grade, marks)
+            grade.save(update_fields=Grade.MARK_FIELDS)
+        self.assertAverages()
+
+    def test_bulk_update(self):
+        for grade, marks in zip(self.grades, self.MARKS):
+            self.set_marks(grade, marks)
+        Grade.objects.bulk_update(self.grades, Grade.MARK_FIELDS)
+        self.assertAverages()
+
+    def test_bulk_create(self):
+        students = [grade.student_id for grade in self.grades]
+        Grade.objects.filter(pk__in=[grade.pk for grade in self.grades]).delete()
+        Grade.objects.bulk_create([
+            Grade(student_id=student_id, course=self.course, td_mark=td, tp_mark=tp, exam_mark=exam)
+            for student_id, (td, tp, exam) in zip(students, self.MARKS)
+        ])
+        self.grades = list(Grade.objects.filter(student_id__in=students).order_by('student__username'))
+        self.assertAverages()
+
+    def test_queryset_update(self):
+        for grade, (td, tp, exam) in zip(self.grades, self.MARKS):
+            # Partly through the row and partly through the update, which must see both
+            Grade.objects.filter(pk=grade.pk).update(td_mark=td)
+            Grade.objects.filter(pk=grade.pk).update(tp_mark=tp, exam_mark=exam)
+        self.assertAverages()
+
+    def test_backfill(self):
+        for grade, marks in zip(self.grades, self.MARKS):
+            self.set_marks(grade, marks)
+        Grade.objects.bulk_update(self.grades, Grade.MARK_FIELDS)
+        Grade.objects.update(average=None)
+        call_command('backfill_grade_averages', '--chunk-size', '2', stdout=io.StringIO())
+        self.assertAverages()
+
+    def test_backfill_rejects_empty_chunks(self):
+        for size in ('0', '-5'):
+            with self.assertRaisesMessage(CommandError, '--chunk-size must be at least 1'):
+                call_command('backfill_grade_averages', '--chunk-size', size, stdout=io.StringIO())
+
+
+class KeysetPaginationTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_walks_every_notification_once_without_counting(self):
+        self.grow_campus(size=5)
+        url = reverse('notifications') + '?page_size=3'
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                page = self.client.get(url).json()
+            self.assertEqual(len(context.captured_queries), 1)
+            seen += [item['id'] for item in page['results']]
+            url = page['next']
+        expected = list(Notification.objects.filter(user=self.student).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_since_returns_only_new_messages_in_order(self):
+        first = self.client.get(reverse('messages')).json()
+        ids = [item['id'] for item in first['results']]
+        self.assertEqual(ids, sorted(ids))
+
+        new = [Message.objects.create(sender=self.teacher, receiver=self.student, content=str(n)) for n in range(3)]
+        page = self.client.get(reverse('messages'), {'since': first['since'], 'page_size': 2}).json()
+        self.assertEqual([item['id'] for item in page['results']], [new[0].id, new[1].id])
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([item['id'] for item in rest['results']], [new[2].id])
+        self.assertIsNone(rest['next'])
+
+        idle = self.client.get(reverse('messages'), {'since': rest['since']}).json()
+        self.assertEqual(idle['results'], [])
+        self.assertEqual(idle['since'], rest['since'])
+
+    def test_rejects_malformed_cursor(self):
+        response = self.client.get(reverse('notifications'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConversationTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+
+    def test_sending_updates_both_inboxes(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.post(reverse('messages'), {'receiver': self.student.id, 'content': 'See you'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        mine = Conversation.objects.get(owner=self.teacher, peer=self.student)
+        theirs = Conversation.objects.get(owner=self.student, peer=self.teacher)
+        self.assertEqual(mine.last_message_id, response.data['id'])
+        self.assertEqual(theirs.last_message_id, response.data['id'])
+        self.assertEqual(mine.unread_count, 0)
+        self.assertEqual(theirs.unread_count, self.rounds + 1)
+
+    def test_inbox_lists_most_recent_thread_first(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        Conversation.record(Message.objects.create(sender=self.teacher, receiver=self.student, content='Latest'))
+        inbox = client.get(reverse('conversations')).json()['results']
+        self.assertEqual(inbox[0]['peer'], self.teacher.id)
+        self.assertEqual(inbox[0]['last_message'], 'Latest')
+        self.assertEqual(len(inbox), Conversation.objects.filter(owner=self.student).count())
+
+    def test_first_messages_sent_at_once_are_both_counted(self):
+        newcomer = User.objects.create_user(username='newcomer', password='pass', role=User.STUDENT)
+        racing = Message.objects.create(sender=self.admin, receiver=newcomer, content='First')
+        message = Message.objects.create(sender=self.admin, receiver=newcomer, content='Second')
+        real_update = QuerySet.update
+        sides = iter(['sender', 'receiver'])
+
+        def update_after_race(queryset, **kwargs):
+            if next(sides) == 'sender':
+                return real_update(queryset, **kwargs)
+            # The other request records its message between this update and the insert
+            patcher.stop()
+            Conversation.record(racing)
+            return 0
+
+        patcher = mock.patch.object(QuerySet, 'update', update_after_race)
+        patcher.start()
+        self.addCleanup(mock.patch.stopall)
+        Conversation.record(message)
+
+        theirs = Conversation.objects.get(owner=newcomer, peer=self.admin)
+        self.assertEqual(theirs.unread_count, 2)
+        self.assertEqual(theirs.last_message_id, message.id)
+        self.assertEqual(Conversation.objects.get(owner=self.admin, peer=newcomer).unread_count, 0)
+
+
+class MarkReadTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        Notification.objects.create(user=self.student, title='Exam', message='...', notification_type='EXAM')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_marks_notifications_by_type_in_one_update(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('notification-bulk-read'), {'notification_type': 'EXAM'}, format='json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['unread']['notifications']['by_type'], {'INFO': self.rounds})
+        updates = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def test_marks_notifications_up_to_id(self):
+        cutoff = Notification.objects.filter(user=self.student).order_by('id')[1].id
+        response = self.client.post(reverse('notification-bulk-read'), {'up_to_id': cutoff}, format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertFalse(Notification.objects.filter(user=self.student, id__lte=cutoff, is_read=False).exists())
+
+    def test_unread_count_is_served_from_cache(self):
+        url = reverse('unread-count')
+        first = self.client.get(url).json()
+        self.assertEqual(first['notifications']['by_type'], {'INFO': self.rounds, 'EXAM': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.student, title='Grade', message='...', notification_type='GRADE')
+            Message.objects.create(sender=self.teacher, receiver=self.student, content='New')
+        with CaptureQueriesContext(connection) as context:
+            counts = self.client.get(url).json()
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(counts['notifications']['total'], self.rounds + 2)
+        self.assertEqual(counts['messages']['by_sender'][str(self.teacher.id)], self.rounds + 1)
+
+        self.client.post(reverse('notification-bulk-read'), {}, format='json')
+        self.assertEqual(self.client.get(url).json()['notifications']['total'], 0)
+
+    def test_new_items_bump_their_counter_without_rewriting_the_counts(self):
+        self.client.get(reverse('unread-count'))
+        with mock.patch.object(cache, 'set') as cache_set, self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.student, title='Grade', message='...', notification_type='GRADE')
+            Message.objects.create(sender=self.teacher, receiver=self.student, content='New')
+        self.assertFalse([call for call in cache_set.call_args_list if call.args[0].startswith('badges:')])
+        counts = self.client.get(reverse('unread-count')).json()
+        self.assertEqual(counts['notifications']['by_type']['GRADE'], 1)
+        self.assertEqual(counts['messages']['by_sender'][str(self.teacher.id)], self.rounds + 1)
+
+    def test_first_message_from_a_sender_is_recounted(self):
+        url = reverse('unread-count')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.admin, receiver=self.student, content='Welcome')
+        counts = self.client.get(url).json()
+        self.assertEqual(counts['messages']['by_sender'][str(self.admin.id)], 1)
+        self.assertEqual(counts['messages']['total'], Message.objects.filter(receiver=self.student, is_read=False).count())
+
+    def test_marks_conversation_read(self):
+        response = self.client.post(reverse('message-mark-read'), {'with_user': self.teacher.id}, format='json')
+        self.assertEqual(response.data['updated'], self.rounds)
+        self.assertNotIn(self.teacher.id, response.data['unread']['messages']['by_sender'])
+        self.assertEqual(Conversation.objects.get(owner=self.student, peer=self.teacher).unread_count, 0)
+
+
+class ScopeTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+
+    def scope_of(self, user):
+        # Loaded fresh, as a request would
+        return scopes.get_scope(User.objects.get(pk=user.pk))
+
+    def test_scope_is_cached_between_requests(self):
+        self.scope_of(self.teacher)
+        user = User.objects.get(pk=self.teacher.pk)
+        with self.assertNumQueries(0):
+            scope = scopes.get_scope(user)
+        self.assertEqual(scope.assignment_ids, set(CourseAssignment.objects.values_list('id', flat=True)))
+        self.assertIsNone(self.scope_of(self.admin))
+
+    def test_new_assignment_refreshes_teacher_and_group(self):
+        course = Course.objects.create(code='NEW', name='New course')
+        other = Group.objects.create(name='Other', academic_year='2025-2026')
+        self.scope_of(self.teacher)
+        self.scope_of(self.student)
+
+        assignment = CourseAssignment.objects.create(
+            teacher=self.teacher, course=course, group=self.group, academic_year='2025-2026'
+        )
+        self.assertIn(assignment.id, self.scope_of(self.teacher).assignment_ids)
+        self.assertIn(course.id, self.scope_of(self.student).course_ids)
+
+        assignment.group = other
+        assignment.save()
+        self.assertNotIn(course.id, self.scope_of(self.student).course_ids)
+        assignment.delete()
+        self.assertNotIn(course.id, self.scope_of(self.teacher).course_ids)
+
+    def test_group_courses_and_student_group_changes(self):
+        course = Course.objects.create(code='NEW', name='New course')
+        self.scope_of(self.student)
+        course.groups.add(self.group)
+        self.assertIn(course.id, self.scope_of(self.student).course_ids)
+        self.group.courses.clear()
+        self.assertNotIn(course.id, self.scope_of(self.student).course_ids)
+
+        student = User.objects.get(pk=self.student.pk)
+        scopes.get_scope(student)
+        student.group = Group.objects.create(name='Other', academic_year='2025-2026')
+        student.save()
+        self.assertEqual(scopes.get_scope(student).group_ids, {student.group_id})
+
+    def test_bulk_attendance_rejects_courses_out_of_scope(self):
+        course = Course.objects.create(code='NEW', name='New course')
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.post(reverse('attendance-bulk'), {'attendance': [
+            {'student': self.student.id, 'course': self.course.id, 'week_number': 2, 'status': 'PRESENT'},
+            {'student': self.student.id, 'course': course.id, 'week_number': 2, 'status': 'PRESENT'},
+        ]}, format='json')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+
+
+class TokenAuthenticationTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+
+    def bearer(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_login_issues_claims(self):
+        self.student.set_password('secret')
+        self.student.save()
+        response = APIClient().post(reverse('login'), {'username': 'student', 'password': 'secret'}, format='json')
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access['role'], User.STUDENT)
+        self.assertEqual(access['group_id'], self.group.id)
+        self.assertEqual(access['ver'], User.objects.get(pk=self.student.pk).token_version)
+
+    def test_requests_do_not_load_the_user(self):
+        client = self.bearer(CampusRefreshToken.for_user(self.student).access_token)
+        client.get(reverse('notifications'))
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(client.get(reverse('notifications')).status_code, 200)
+            self.assertEqual(client.get(reverse('file-list')).status_code, 200)
+        self.assertFalse([q for q in context.captured_queries if 'FROM "api_user"' in q['sql']])
+        # The profile reads the row and its group in one query
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(reverse('profile')).data['username'], 'student')
+
+    def test_role_checks_use_claims(self):
+        client = self.bearer(CampusRefreshToken.for_user(self.student).access_token)
+        self.assertEqual(client.get(reverse('grade-list')).status_code, 403)
+        self.assertEqual(client.get(reverse('my-grades')).status_code, 200)
+        teacher = self.bearer(CampusRefreshToken.for_user(self.teacher).access_token)
+        self.assertEqual(teacher.get(reverse('grade-list')).status_code, 200)
+
+    def test_token_user_holds_the_claimed_values(self):
+        user = user_from_token(CampusRefreshToken.for_user(self.student).access_token)
+        self.assertEqual(
+            (user.pk, user.role, user.is_approved, user.group_id, user.is_active, user.token_version),
+            (self.student.pk, User.STUDENT, True, self.group.id, True, self.student.token_version),
+        )
+
+    def refresh_with(self, refresh):
+        return APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+
+    def test_claim_changes_are_picked_up_on_refresh(self):
+        refresh = CampusRefreshToken.for_user(self.student)
+        client = self.bearer(refresh.access_token)
+        self.assertEqual(client.get(reverse('notifications')).status_code, 200)
+
+        student = User.objects.get(pk=self.student.pk)
+        student.group = Group.objects.create(name='Other', academic_year='2025-2026')
+        student.save()
+        self.assertEqual(client.get(reverse('notifications')).status_code, 401)
+        response = self.refresh_with(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['group_id'], student.group_id)
+        self.assertEqual(self.bearer(response.data['access']).get(reverse('notifications')).status_code, 200)
+
+        student.first_name = 'Renamed'
+        student.save()
+        client = self.bearer(CampusRefreshToken.for_user(student).access_token)
+        self.assertEqual(client.get(reverse('notifications')).status_code, 200)
+        student.revoke_tokens()
+        self.assertEqual(client.get(reverse('notifications')).status_code, 401)
+
+    def test_approval_does_not_log_the_student_out(self):
+        pending = User.objects.create_user('newcomer', password='pass', role=User.STUDENT, is_approved=False)
+        refresh = CampusRefreshToken.for_user(pending)
+        pending.is_approved = True
+        pending.save()
+
+        response = self.refresh_with(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(AccessToken(response.data['access'])['is_approved'], True)
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ])
+    def test_login_rehashing_the_password_keeps_other_sessions(self):
+        self.student.password = make_password('secret', hasher='pbkdf2_sha1')
+        self.student.save()
+        other_device = CampusRefreshToken.for_user(User.objects.get(pk=self.student.pk))
+
+        response = APIClient().post(reverse('login'), {'username': 'student', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.student.pk).password.startswith('md5$'))
+        self.assertEqual(self.refresh_with(other_device).status_code, 200)
+
+        student = User.objects.get(pk=self.student.pk)
+        student.set_password('changed')
+        student.save()
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 401)
+
+    def test_refresh_keeps_claims(self):
+        refresh = CampusRefreshToken.for_user(self.teacher)
+        response = APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['role'], User.TEACHER)
+
+    def test_deploy_check_refuses_a_process_local_cache(self):
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(CACHES=local, DEBUG=False):
+            self.assertEqual([message.id for message in checks.check_shared_cache(None)], ['api.E001'])
+        with override_settings(CACHES=local, DEBUG=True):
+            self.assertEqual([message.id for message in checks.check_shared_cache(None)], ['api.W001'])
+        with override_settings(CACHES=shared, DEBUG=False):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class TokenRevocationTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        revocation_store.reset()
+        self.refresh = CampusRefreshToken.for_user(self.student)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def refresh_with(self, token):
+        return APIClient().post(reverse('token_refresh'), {'refresh': str(token)}, format='json')
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('notifications')).status_code, 401)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_logout_refuses_someone_elses_refresh_token(self):
+        other = CampusRefreshToken.for_user(self.teacher)
+        response = self.client.post(reverse('logout'), {'refresh': str(other)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.refresh_with(other).status_code, 200)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 200)
+
+    def test_checks_are_answered_from_memory(self):
+        revocation_store.revoke(self.refresh)
+        revocation_store.is_revoked('unknown')
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_store.is_revoked('another-unknown'))
+            self.assertTrue(revocation_store.is_revoked(self.refresh['jti']))
+
+    def test_other_processes_pick_up_revocations(self):
+        other = RevocationStore()
+        self.assertFalse(other.is_revoked(self.refresh['jti']))
+        with self.captureOnCommitCallbacks(execute=True):
+            revocation_store.revoke(self.refresh)
+        self.assertTrue(other.is_revoked(self.refresh['jti']))
+
+    def test_rows_committed_below_synced_ids_are_picked_up(self):
+        other = RevocationStore()
+        expires_at = timezone.now() + timedelta(days=1)
+        RevokedToken.objects.create(id=100, jti='early', token_type='access', expires_at=expires_at)
+        revocation.bump_generation()
+        self.assertTrue(other.is_revoked('early'))
+
+        # Inserted before 'early' by a transaction that committed after it was read
+        RevokedToken.objects.create(id=50, jti='late', token_type='access', expires_at=expires_at)
+        revocation.bump_generation()
+        self.assertTrue(other.is_revoked('late'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f'jti-{n}' for n in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{n}' in bloom for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_purge_removes_expired_entries_in_batches(self):
+        now = timezone.now()
+        for n in range(5):
+            RevokedToken.objects.create(jti=f'old-{n}', token_type='access', expires_at=now - timedelta(days=1))
+        RevokedToken.objects.create(jti='live', token_type='access', expires_at=now + timedelta(days=1))
+        call_command('purge_revoked_tokens', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+    def test_purge_refuses_an_empty_batch(self):
+        for batch_size in (0, -1):
+            with self.assertRaisesMessage(CommandError, '--batch-size must be at least 1'):
+                call_command('purge_revoked_tokens', batch_size=batch_size, stdout=io.StringIO())
+
+
+class CatalogCacheTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        url = reverse('group-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(first.json(), second.json())
+        self.assertIn('Last-Modified', second)
+
+    def test_if_none_match_returns_304_without_reading(self):
+        url = reverse('group-detail', kwargs={'pk': self.group.pk})
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_modified_since_returns_304(self):
+        url = reverse('course-list')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_bump_the_version(self):
+        url = reverse('group-detail', kwargs={'pk': self.group.pk})
+        etag = self.client.get(url)['ETag']
+
+        course = Course.objects.create(code='NEW', name='New course')
+        self.group.courses.add(course)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('NEW', [c['code'] for c in response.json()['courses']])
+
+        count = response.json()['student_count']
+        User.objects.create_user('newcomer', role=User.STUDENT, student_id='S-new', group=self.group)
+        self.assertEqual(self.client.get(url).json()['student_count'], count + 1)
+
+        course.name = 'Renamed'
+        course.save()
+        names = [c['name'] for c in self.client.get(url).json()['courses']]
+        self.assertIn('Renamed', names)
+
+    def test_teacher_rename_refreshes_schedules(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('schedule-list')
+        client.get(url)
+        self.teacher.first_name = 'Ada'
+        self.teacher.save()
+        names = {s['teacher_name'] for s in client.get(url).json()['results']}
+        self.assertIn('Ada', names)
+
+
+class StudentDashboardTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.url = reverse('student-dashboard')
+
+    def test_returns_every_section_then_serves_from_cache(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(set(data), set(views.StudentDashboardView.sections))
+        self.assertEqual(len(data['courses']), self.rounds)
+        self.assertEqual(data['profile']['username'], 'student')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).json(), data)
+
+    def test_selects_sections(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {'sections': 'grades,notifications'}).json()
+        self.assertEqual(set(data), {'grades', 'notifications'})
+        response = self.client.get(self.url, {'sections': 'grades,salary'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_writes_refresh_the_dashboard(self):
+        params = {'sections': 'grades,notifications,attendance'}
+        self.client.get(self.url, params)
+
+        grade = Grade.objects.get(student=self.student, course=self.course)
+        grade.exam_mark = 19
+        grade.save()
+        self.client.post(reverse('notification-bulk-read'), {}, format='json')
+        teacher = APIClient()
+        teacher.force_authenticate(self.teacher)
+        teacher.post(reverse('attendance-bulk'), {'attendance': [
+            {'student': self.student.id, 'course': self.course.id, 'week_number': 1, 'status': 'ABSENT'},
+        ]}, format='json')
+
+        data = self.client.get(self.url, params).json()
+        marks = {g['course']: g['exam_mark'] for g in data['grades']}
+        self.assertEqual(float(marks[self.course.id]), 19)
+        self.assertFalse(any(n['is_read'] is False for n in data['notifications']))
+        statuses = {a['course']: a['status'] for a in data['attendance'] if a['week_number'] == 1}
+        self.assertEqual(statuses[self.course.id], 'ABSENT')
+
+    def test_other_students_are_not_affected(self):
+        self.client.get(self.url)
+        Notification.objects.create(user=self.teacher, title='Staff', message='...')
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+
+class SparseFieldsetTests(QueryBudgetMixin, CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.teacher.pk))
+
+    @staticmethod
+    def rows(data):
+        return data['results'] if isinstance(data, dict) else data
+
+    def test_every_route_stays_within_budget_with_a_sparse_fieldset(self):
+        routes = RouteQueryBudgetTests.route_kwargs
+        for name, (role, budget, _) in ROUTE_BUDGETS.items():
+            with self.subTest(route=name):
+                url = reverse(name, kwargs=routes(self, name))
+                client = RouteQueryBudgetTests.client_for(self, role)
+                with self.assertMaxQueries(budget, name):
+                    response = client.get(url, {'fields': 'id'})
+                self.assertEqual(response.status_code, 200)
+
+    def test_nested_fields_do_not_load_per_row(self):
+        admin, student = APIClient(), APIClient()
+        admin.force_authenticate(self.admin)
+        student.force_authenticate(self.student)
+        urls = {
+            'assignment-list': (admin, f"{reverse('assignment-list')}?fields=id,sessions"),
+            'student-courses': (student, f"{reverse('student-courses')}?fields=id,sessions"),
+        }
+        before = {name: self.count_queries(client, url) for name, (client, url) in urls.items()}
+        self.grow_campus(size=6)
+        for name, (client, url) in urls.items():
+            with self.subTest(route=name):
+                self.assertEqual(self.count_queries(client, url), before[name])
+                rows = self.rows(client.get(url).json())
+                self.assertEqual(set(rows[0]), {'id', 'sessions'})
+
+    def test_only_selected_fields_are_sent_and_read(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(reverse('grade-list'), {'fields': 'id,course_code,exam_mark'}).json()
+        self.assertEqual(set(self.rows(data)[0]), {'id', 'course_code', 'exam_mark'})
+        grade_query = context.captured_queries[-1]['sql']
+        self.assertIn('"api_course"."code"', grade_query)
+        self.assertNotIn('"api_course"."description"', grade_query)
+        self.assertNotIn('"api_grade"."comments"', grade_query)
+        self.assertNotIn('JOIN "api_user"', grade_query)
+
+    def test_excluded_relations_are_not_loaded(self):
+        url = reverse('assignment-list')
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        full = self.count_queries(admin, url)
+        sparse = self.count_queries(admin, f'{url}?exclude=sessions')
+        self.assertEqual(sparse, full - 1)
+        self.assertNotIn('sessions', self.rows(admin.get(url, {'exclude': 'sessions'}).json())[0])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('grade-list'), {'fields': 'id,salary'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['fields'], ['Unknown field: salary'])
+
+    def test_compact_format_sends_columns(self):
+        url = reverse('attendance-list')
+        rows = self.rows(self.client.get(url).json())
+        data = self.client.get(url, {'format': 'compact'}).json()
+        self.assertEqual(data['results']['fields'], list(rows[0]))
+        self.assertEqual(data['results']['rows'], [list(row.values()) for row in rows])
+
+        compact = self.client.get(url, {'fields': 'id,status', 'format': 'compact'}).json()
+        self.assertEqual(compact['results']['fields'], ['id', 'status'])
+
+    def test_compact_and_json_catalog_responses_have_different_tags(self):
+        url = reverse('course-list')
+        json_tag = self.client.get(url)['ETag']
+        compact_tag = self.client.get(url, HTTP_ACCEPT='application/vnd.campusconnect.compact+json')['ETag']
+        self.assertNotEqual(json_tag, compact_tag)
+
+
+class FastJSONTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        Grade.objects.filter(student=self.student).update(exam_mark=Decimal('12.25'))
+
+    def payloads(self):
+        yield list(GradeSerializer(Grade.objects.select_related('student', 'course'), many=True).data)
+        yield list(AttendanceSerializer(Attendance.objects.select_related('student', 'course'), many=True).data)
+        yield {
+            'mark': Decimal('13.50'), 'at': timezone.now(), 'day': timezone.localdate(), 'when': time(8, 30),
+            'label': gettext_lazy('Present'), 'text': 'line\u2028break \u00e9', 'ids': {1: 'a'}, 'big': 2 ** 70,
+        }
+
+    def test_renders_the_same_bytes_as_the_stock_renderer(self):
+        for data in self.payloads():
+            self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = 'application/json; indent=2'
+        self.assertEqual(
+            renderers.FastJSONRenderer().render({'a': [1]}, indented), JSONRenderer().render({'a': [1]}, indented)
+        )
+
+    def test_parses_like_the_stock_parser(self):
+        for data in self.payloads():
+            body = JSONRenderer().render(data)
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for body in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_falls_back_without_orjson(self):
+        data = next(self.payloads())
+        with mock.patch.object(renderers, 'orjson', None), mock.patch('api.parsers.orjson', None):
+            body = renderers.FastJSONRenderer().render(data)
+            self.assertEqual(body, JSONRenderer().render(data))
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), data)
+
+    def test_api_responses_use_it(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        response = client.get(reverse('grade-list'))
+        self.assertIsInstance(response.accepted_renderer, renderers.FastJSONRenderer)
+        self.assertEqual(response.json()['results'][0]['updated_at'][10], ' ')
+
+
+class GradebookTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = reverse('gradebook', kwargs={'assignment_id': self.assignment.pk})
+
+    def rows(self):
+        return {row['student']: row for row in self.client.get(self.url).json()['rows']}
+
+    def test_matrix_has_one_row_per_student(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['columns'], ['td_mark', 'tp_mark', 'exam_mark', 'average'])
+        students = User.objects.filter(group=self.group, role=User.STUDENT)
+        self.assertEqual({row['student'] for row in data['rows']}, set(students.values_list('id', flat=True)))
+        self.assertTrue(all(len(row['marks']) == 4 for row in data['rows']))
+
+    def test_bulk_save_writes_in_one_update(self):
+        rows = self.rows()
+        changes = [
+            {'student': student_id, 'updated_at': row['updated_at'], 'exam_mark': '12.5', 'td_mark': 15}
+            for student_id, row in rows.items()
+        ]
+        # assignment, savepoint, locked rows, one UPDATE, release
+        with self.assertNumQueries(5):
+            response = self.client.put(self.url, {'rows': changes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], len(rows))
+        grade = Grade.objects.get(student=self.student, course=self.course)
+        self.assertEqual((grade.td_mark, grade.exam_mark, grade.average), (15, Decimal('12.5'), Decimal('13.75')))
+        self.assertEqual(self.rows()[self.student.id]['marks'], ['15.00', None, '12.50', '13.75'])
+
+        # Saving the same marks again is a no-op
+        again = [dict(row, updated_at=self.rows()[row['student']]['updated_at']) for row in changes]
+        self.assertEqual(self.client.put(self.url, {'rows': again}, format='json').json()['updated'], 0)
+
+    def test_stale_rows_conflict_and_nothing_is_written(self):
+        rows = self.rows()
+        grade = Grade.objects.get(student=self.student, course=self.course)
+        grade.tp_mark = 8
+        grade.save()
+        changes = [
+            {'student': student_id, 'updated_at': row['updated_at'], 'exam_mark': 10}
+            for student_id, row in rows.items()
+        ]
+        response = self.client.put(self.url, {'rows': changes}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([row['student'] for row in response.json()['conflicts']], [self.student.id])
+        self.assertFalse(Grade.objects.filter(course=self.course, exam_mark=10).exists())
+
+    def test_invalid_rows_are_reported_by_index(self):
+        row = self.rows()[self.student.id]
+        outsider = User.objects.create_user('outsider', role=User.STUDENT, is_approved=True)
+        response = self.client.put(self.url, {'rows': [
+            {'student': self.student.id, 'updated_at': row['updated_at'], 'exam_mark': 25},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['index'], 0)
+        response = self.client.put(self.url, {'rows': [
+            {'student': outsider.id, 'updated_at': row['updated_at'], 'exam_mark': 10},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_teachers_cannot_open_the_sheet(self):
+        other = User.objects.get(username='teacher1')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get(self.url).status_code, 404)
+        self.assertEqual(client.put(self.url, {'rows': []}, format='json').status_code, 404)
+
+
+class RealtimeTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        realtime.reset_broker()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, user):
+        return self.loop.run_until_complete(realtime.get_broker().subscribe(user.id))
+
+    def next_event(self, subscription):
+        return self.loop.run_until_complete(asyncio.wait_for(subscription.get(), 1))
+
+    def test_new_message_is_pushed_to_both_sides_on_commit(self):
+        inbox = self.subscribe(self.student)
+        outbox = self.subscribe(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(sender=self.teacher, receiver=self.student, content='Hello')
+            self.assertTrue(inbox.queue.empty())
+
+        for subscription in (inbox, outbox):
+            event = self.next_event(subscription)
+            self.assertEqual(event['type'], 'message')
+            self.assertEqual(event['data']['id'], message.id)
+
+    def test_new_notification_is_pushed_to_its_user_only(self):
+        mine = self.subscribe(self.student)
+        other = self.subscribe(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.student, title='Exam', message='...', notification_type='EXAM')
+
+        self.assertEqual(self.next_event(mine)['data']['title'], 'Exam')
+        self.assertTrue(other.queue.empty())
+
+    def test_stream_is_only_served_over_asgi(self):
+        response = self.client.get(reverse('event-stream'))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_requires_a_token(self):
+        response = await AsyncClient().get(reverse('event-stream'), {'token': 'invalid'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_delivers_published_events(self):
+        token = str(AccessToken.for_user(self.student))
+        response = await AsyncClient().get(reverse('event-stream'), {'token': token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b': connected\n\n')
+        realtime.publish(self.student.id, 'notification', {'title': 'Exam'})
+        frame = (await anext(stream)).decode()
+        self.assertTrue(frame.startswith('event: notification\n'))
+        self.assertEqual(json.loads(frame.split('data: ', 1)[1]), {'title': 'Exam'})
+        await stream.aclose()
+
+    async def test_stream_prefers_the_authorization_header(self):
+        token = str(AccessToken.for_user(self.student))
+        response = await AsyncClient().get(
+            reverse('event-stream'), {'token': 'invalid'}, headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        await aiter(response.streaming_content).aclose()
+
+    async def test_stream_ends_once_its_token_is_revoked(self):
+        token = str(CampusRefreshToken.for_user(self.student).access_token)
+        with mock.patch.object(realtime, 'HEARTBEAT_SECONDS', 0.01):
+            response = await AsyncClient().get(reverse('event-stream'), {'token': token})
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await anext(stream), b': connected\n\n')
+            self.assertEqual(await anext(stream), b': ping\n\n')
+
+            await sync_to_async(self.student.revoke_tokens)()
+            self.assertTrue((await anext(stream)).startswith(b'event: unauthorized\n'))
+            with self.assertRaises(StopAsyncIteration):
+                await anext(stream)
+
+
+# Tables that grow with the user base; the hot list queries must reach them through an index
+LARGE_TABLES = (
+    'api_user', 'api_grade', 'api_attendance', 'api_coursefile',
+    'api_timetable', 'api_message', 'api_notification',
+)
+
+# Admin lists and user search page through most of the users table, where a scan is the right plan
+FULL_TABLE_ROUTES = {'user-search', 'pending-students', 'student-list', 'assignment-list', 'schedule-list'}
+
+
+def indexed_columns(model):
+    """Columns that lead an index of `model`: keys, unique and foreign key fields, unique_together and Meta.indexes"""
+    opts = model._meta
+    columns = {field.column for field in opts.concrete_fields if field.primary_key or field.unique or field.db_index}
+    columns |= {opts.get_field(fields[0]).column for fields in opts.unique_together}
+    columns |= {opts.get_field(index.fields[0].lstrip('-')).column for index in opts.indexes if index.fields}
+    return columns
+
+
+class IndexCoverageTests(CampusFixtureMixin, TestCase):
+    """
+    Every read of a large table by a per-user route filters or joins on a column leading an index
+
+    Unlike ListQueryPlanTests this runs on any database: it reads the SQL the
+    ORM emits and the indexes the models declare.
+    """
+
+    def setUp(self):
+        self.build_campus()
+
+    def test_large_table_reads_use_a_leading_index_column(self):
+        models_by_table = {model._meta.db_table: model for model in apps.get_app_config('api').get_models()}
+        routes = RouteQueryBudgetTests.route_kwargs
+        for name, (role, _, _) in ROUTE_BUDGETS.items():
+            if name in FULL_TABLE_ROUTES:
+                continue
+            with self.subTest(route=name):
+                client = APIClient()
+                client.force_authenticate(getattr(self, role))
+                url = reverse(name, kwargs=routes(self, name))
+                with CaptureQueriesContext(connection) as context:
+                    self.assertEqual(client.get(url).status_code, 200)
+                for query in context.captured_queries:
+                    sql = query['sql']
+                    for table in LARGE_TABLES:
+                        if f'"{table}"' not in sql:
+                            continue
+                        # The table by name, or by the alias a second join of it gets ("api_user" T3)
+                        names = '|'.join([f'"{table}"', *re.findall(rf'"{table}" (T\d+)', sql)])
+                        used = set(re.findall(
+                            rf'(?:{names})\."(\w+)" (?:=|IN \(|IS NULL|IS NOT NULL|[<>]=?)', sql,
+                        )) | set(re.findall(rf'= (?:{names})\."(\w+)"', sql))
+                        self.assertTrue(
+                            used & indexed_columns(models_by_table[table]),
+                            f'{name} reads {table} without an indexed filter ({sorted(used)}):\n{sql}',
+                        )
+
+
+class BenchmarkTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+
+    def test_measures_every_route_within_its_query_budget(self):
+        results = benchmarks.run(repeat=2, warmup=1)
+        self.assertEqual(set(results), set(ROUTE_BUDGETS) | set(benchmarks.QUERY_BUDGETS))
+        self.assertIn('search=', results['user-search:ranked']['url'])
+        for name, result in results.items():
+            with self.subTest(route=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['queries'], benchmarks.budget_of(name).queries)
+                self.assertGreater(result['bytes'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_reports_budget_overruns_and_regressions(self):
+        results = benchmarks.run(routes={'notifications'}, repeat=2, warmup=1)
+        result = results['notifications']
+        slow = {'notifications': dict(result, queries=5, p95_ms=10 ** 6)}
+        self.assertEqual(len(benchmarks.over_budget(slow)), 2)
+        self.assertEqual(benchmarks.regressions(results, results), [])
+        baseline = {'notifications': dict(result, queries=0, bytes=result['bytes'] // 2)}
+        self.assertEqual(len(benchmarks.regressions(results, baseline)), 2)
+
+
+class SearchTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.jean = User.objects.create_user(
+            'jmartin', email='jean.martin@campus.dz', first_name='Jean', last_name='Martin',
+            role=User.STUDENT, is_approved=True, student_id='S2025-17',
+        )
+        self.pending = User.objects.create_user(
+            'jmarchal', first_name='Jeanne', last_name='Marchal', role=User.STUDENT, is_approved=False,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def search(self, name, term):
+        response = self.client.get(reverse(name), {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [row.get('username', row.get('code')) for row in response.data['results']]
+
+    def test_prefix_query_keeps_only_letters_and_digits(self):
+        self.assertIsNone(search.prefix_query(['--', "'"]))
+        self.assertEqual(
+            search.prefix_tsquery(["Jea", "o'br", 'S2025-1']),
+            "'jea':* & 'o':* & 'br':* & 's2025':* & '1':*",
+        )
+
+    def test_user_search_hides_students_awaiting_approval(self):
+        self.assertEqual(self.search('user-search', 'jmar'), ['jmartin'])
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.search('student-list', 'jmar'), ['jmarchal', 'jmartin'])
+
+    def test_course_search(self):
+        self.assertIn(self.course.code, self.search('course-list', self.course.code[:2]))
+
+    def test_no_index_outside_postgresql(self):
+        if connection.vendor != 'postgresql':
+            self.assertEqual(search.create_search_indexes(), [])
+
+    def test_created_indexes_are_reported_on_the_migrate_output(self):
+        out = io.StringIO()
+        with mock.patch.object(search, 'create_search_indexes', return_value=['user_search_idx']):
+            emit_post_migrate_signal(1, False, 'default', stdout=out)
+            emit_post_migrate_signal(0, False, 'default', stdout=out)
+        self.assertEqual(out.getvalue(), '  Created search index user_search_idx\n')
+
+
+class DatabaseConnectionTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+
+    def test_admin_sees_connection_reuse_of_the_worker(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('db-connections'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.data['default']
+        self.assertEqual(stats['vendor'], connection.vendor)
+        self.assertFalse(stats['pooled'])
+        self.assertIsNone(stats['pool'])
+        self.assertIn('connects', stats)
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(reverse('db-connections')).status_code, 403)
+
+    def test_pool_size_budget(self):
+        options = connection.settings_dict['OPTIONS']
+        self.assertIsNone(database.pool_max_size('default'))
+        with mock.patch.dict(options, {'pool': True}):
+            self.assertEqual(database.pool_max_size('default'), 4)
+        with mock.patch.dict(options, {'pool': {'min_size': 2, 'max_size': 12}}):
+            self.assertTrue(database.is_pooled('default'))
+            self.assertEqual(database.pool_max_size('default'), 12)
+
+    @skipUnless(connection.vendor != 'postgresql', 'Checks the error on other databases')
+    def test_budget_command_needs_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'only applies to PostgreSQL'):
+            call_command('db_connections', stdout=io.StringIO())
+
+
+@override_settings(PROFILING={'ENABLED': True, 'WINDOW': 50, 'FLUSH_SECONDS': 0})
+class ProfilingTests(CampusFixtureMixin, TestCase):
+
+    def setUp(self):
+        self.build_campus()
+        profiling.recorder.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_adds_server_timing_and_records_the_endpoint(self):
+        response = self.client.get(reverse('course-list'))
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(
+            timing, r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+
+        stats = profiling.recorder.endpoints['GET course-list']
+        self.assertEqual(stats.roles, {User.STUDENT: 1})
+        total_ms, db_ms, serialize_ms, render_ms, queries, size = stats.samples[0]
+        self.assertEqual(size, len(response.content))
+        self.assertGreater(queries, 0)
+        self.assertGreater(serialize_ms, 0)
+        self.assertEqual(re.search(r'serialize;dur=([\d.]+)', timing)[1], f'{serialize_ms:.1f}')
+        self.assertLessEqual(serialize_ms + render_ms, total_ms)
+
+    @override_settings(PROFILING={'ENABLED': False})
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('course-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.recorder.endpoints, {})
+
+    def test_normalizes_statements_that_differ_only_by_list_length_or_page(self):
+        self.assertEqual(
+            profiling.normalize_sql('SELECT 1 FROM t WHERE id IN (%s, %s, %s) LIMIT 21 OFFSET 40'),
+            profiling.normalize_sql('SELECT 1 FROM t WHERE id IN (%s, %s) LIMIT 21 OFFSET 0'),
+        )
+        self.assertEqual(
+            profiling.normalize_sql('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO t (a, b) VALUES (...), ...',
+        )
+
+    def test_report_ranks_endpoints_and_flags_repeated_statements(self):
+        profiling.recorder.record('GET fast', User.STUDENT, (1.0, 0.5, 0.2, 0.1, 1, 100), {'SELECT a': 1})
+        for _ in range(3):
+            profiling.recorder.record('GET slow', User.TEACHER, (90.0, 80.0, 5.0, 1.0, 21, 900), {
+                'SELECT grade': 20, 'SELECT a': 1,
+            })
+        report = profiling.summarize(profiling.collect())
+        report.sort(key=lambda row: row['p95_ms'], reverse=True)
+        self.assertEqual([row['endpoint'] for row in report], ['GET slow', 'GET fast'])
+        self.assertEqual(report[0]['statements'][0], {
+            'sql': 'SELECT grade', 'executions': 60, 'per_request': 20, 'max_per_request': 20,
+        })
+
+        out = io.StringIO()
+        call_command('slow_endpoints', '--limit', '1', '--reset', stdout=out)
+        self.assertIn('GET slow  (3 requests: TEACHER 3)', out.getvalue())
+        self.assertIn('20.0x/request (max 20)  SELECT grade', out.getvalue())
+        self.assertNotIn('GET fast', out.getvalue())
+        self.assertEqual(profiling.collect(), {})
+
+
+class GenerateLoadDataTests(TestCase):
+
+    sizes = {'faculties': 2, 'groups': 2, 'students': 5, 'courses': 3, 'teachers': 2, 'weeks': 4,
+             'messages': 3, 'notifications': 2, 'chunk_size': 7}
+
+    def generate(self, **options):
+        call_command('generate_load_data', stdout=io.StringIO(), **self.sizes, **options)
+        return list(
+            Grade.objects.order_by('student__username', 'course__code')
+            .values_list('student__username', 'course__code', 'td_mark', 'exam_mark', 'average')
+        )
+
+    def test_writes_the_requested_sizes(self):
+        self.generate()
+        students = 2 * 2 * 5
+        self.assertEqual(User.objects.filter(role=User.STUDENT).count(), students)
+        self.assertEqual(CourseAssignment.objects.count(), 2 * 2 * 3)
+        self.assertEqual(Grade.objects.count(), students * 3)
+        self.assertEqual(Attendance.objects.count(), students * 3 * 4)
+        self.assertEqual(Message.objects.count(), students * 3)
+        # Every message thread has an inbox row on both sides
+        pairs = set(Message.objects.values_list('sender_id', 'receiver_id'))
+        self.assertEqual(Conversation.objects.count(), len(pairs | {(b, a) for a, b in pairs}))
+        self.assertGreater(Message.objects.dates('timestamp', 'day').count(), 1)
+
+    def test_is_deterministic_under_a_seed(self):
+        first = self.generate(seed=7)
+        with self.assertRaises(CommandError):
+            self.generate(seed=7)
+        self.assertEqual(self.generate(seed=7, replace=True), first)
+        self.assertNotEqual(self.generate(seed=8, replace=True), first)
+
+    def test_rejects_sizes_that_would_write_nothing(self):
+        for option, value, message in (
+            ('chunk_size', 0, '--chunk-size must be at least 1'),
+            ('chunk_size', -1, '--chunk-size must be at least 1'),
+            ('students', 0, 'must be at least 1'),
+            ('weeks', -1, 'must be at least 1'),
+            ('messages', -1, 'cannot be negative'),
+        ):
+            with self.subTest(option=option, value=value), self.assertRaisesMessage(CommandError, message):
+                call_command('generate_load_data', stdout=io.StringIO(), **{**self.sizes, option: value})
+        self.assertFalse(User.objects.exists())
+
+    def test_replace_keeps_courses_it_did_not_generate(self):
+        kept = [Course.objects.create(code=code, name=code) for code in ('LT101', 'LTX01-001', 'CS101')]
+        self.generate()
+        self.generate(replace=True)
+        self.assertEqual(Course.objects.filter(pk__in=[course.pk for course in kept]).count(), len(kept))
+
+
+class ReplicaRoutingTests(CampusFixtureMixin, TransactionTestCase):
+    """
+    The replica alias mirrors the primary's test database, so both hold the same rows
+
+    `manage.py test` defines the alias when no replica is configured (see settings).
+    """
+
+    databases = {'default', replicas.REPLICA}
+
+    def setUp(self):
+        self.build_campus()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def queries_by_alias(self, request):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[replicas.REPLICA]) as replica:
+            response = request()
+        self.assertLess(response.status_code, 400, response.data)
+        return len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_lists_read_from_the_replica(self):
+        for name in ('grade-list', 'attendance-list', 'file-list', 'timetable-list', 'user-search'):
+            with self.subTest(route=name):
+                primary, replica = self.queries_by_alias(lambda: self.client.get(reverse(name)))
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_writer_reads_from_the_primary_until_the_window_ends(self):
+        self.queries_by_alias(lambda: self.client.post(reverse('attendance-bulk'), {'attendance': [
+            {'student': self.student.id, 'course': self.course.id, 'week_number': 3, 'status': 'ABSENT'},
+        ]}, format='json'))
+        self.assertTrue(replicas.is_sticky(self.teacher.pk))
+        primary, replica = self.queries_by_alias(lambda: self.client.get(reverse('attendance-list')))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other users are not pinned
+        student = APIClient()
+        student.force_authenticate(self.student)
+        self.assertEqual(self.queries_by_alias(lambda: student.get(reverse('my-attendance')))[0], 0)
+
+        cache.delete(replicas.sticky_key(self.teacher.pk))
+        self.assertEqual(self.queries_by_alias(lambda: self.client.get(reverse('attendance-list')))[0], 0)
+
+    def test_transactions_and_writes_use_the_primary(self):
+        with replicas.replica_reads(self.teacher) as used:
+            self.assertTrue(used)
+            self.assertEqual(Grade.objects.all().db, replicas.REPLICA)
+            grade = Grade.objects.filter(student=self.student).first()
+            with transaction.atomic():
+                self.assertEqual(Grade.objects.all().db, 'default')
+            grade.save(update_fields=['updated_at'])
+        self.assertEqual(Grade.objects.all().db, 'default')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are checked on PostgreSQL only')
+class ListQueryPlanTests(CampusFixtureMixin, TransactionTestCase):
+    """Fails when a list endpoint falls back to a sequential scan on a large table"""
+
+    def setUp(self):
+        self.build_campus()
+        self.seed_bulk()
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE')
+
+    def seed_bulk(self, groups=100, students_per_group=40, rows_per_student=5):
+        courses = list(Course.objects.all())
+        other_teacher = User.objects.filter(role=User.TEACHER).exclude(pk=self.teacher.pk).first()
+        new_groups = Group.objects.bulk_create([
+            Group(name=f'Bulk {g}', academic_year='2025-2026') for g in range(groups)
+        ])
+        students = User.objects.bulk_create([
+            User(username=f'bulk{g}_{n}', role=User.STUDENT, is_approved=n % 10 != 0,
+                 student_id=f'B{g}-{n}', group=group)
+            for g, group in enumerate(new_groups) for n in range(students_per_group)
+        ])
+        bulk_courses = Course.objects.bulk_create([
+            Course(code=f'B{g}', name=f'Bulk course {g}') for g in range(groups)
+        ])
+        CourseAssignment.objects.bulk_create([
+            CourseAssignment(teacher=other_teacher, course=course, group=group, academic_year='2025-2026')
+            for course, group in zip(bulk_courses, new_groups)
+        ])
+        Grade.objects.bulk_create([
+            Grade(student=student, course=bulk_courses[i % groups]) for i, student in enumerate(students)
+        ])
+        Attendance.objects.bulk_create([
+            Attendance(student=student, course=bulk_courses[i % groups], week_number=week)
+            for i, student in enumerate(students) for week in range(1, rows_per_student + 1)
+        ])
+        CourseFile.objects.bulk_create([
+            CourseFile(course=course, uploaded_by=other_teacher, title=f'{course.code} {n}', file=f'f/{n}.pdf')
+            for course in bulk_courses for n in range(rows_per_student * 4)
+        ])
+        Timetable.objects.bulk_create([
+            Timetable(group=group, title=f'{group.name} {n}', image=f't/{n}.png',
+                      academic_year='2025-2026', is_active=n == 0)
+            for group in new_groups for n in range(rows_per_student * 4)
+        ])
+        Message.objects.bulk_create([
+            Message(sender=student, receiver=students[(i + 1) % len(students)], content='...')
+            for i, student in enumerate(students) for _ in range(rows_per_student)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=student, title='Bulk', message='...', is_read=n % 2 == 0)
+            for student in students for n in range(rows_per_student)
+        ])
+
+    def test_search_uses_the_search_index(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for url in (reverse('user-search'), reverse('student-list')):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url, {'search': 'bulk42_7'})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('bulk42_7', [row['username'] for row in response.data['results']])
+                for query in context.captured_queries:
+                    scans = self.sequential_scans(query['sql'])
+                    self.assertFalse(scans, f'{url} scans {scans}:\n{query["sql"]}')
+
+    def sequential_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        return [table for table in LARGE_TABLES if f'Seq Scan on {table} ' in f'{plan} ']
+
+    def test_list_endpoints_use_indexes(self):
+        routes = RouteQueryBudgetTests.route_kwargs
+        for name, (role, _, _) in ROUTE_BUDGETS.items():
+            if name in FULL_TABLE_ROUTES:
+                continue
+            with self.subTest(route=name):
+                client = APIClient()
+                client.force_authenticate(getattr(self, role))
+                url = reverse(name, kwargs=routes(self, name))
+                with CaptureQueriesContext(connection) as context:
+                    self.assertEqual(client.get(url).status_code, 200)
+                for query in context.captured_queries:
+                    if not query['sql'].lstrip().upper().startswith('SELECT'):
+                        continue
+                    scans = self.sequential_scans(query['sql'])
+                    self.assertFalse(scans, f'{url} scans {scans}:\n{query["sql"]}')
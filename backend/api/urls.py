@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
 
-from . import views
+from . import realtime, views
 
 urlpatterns = [
 
@@ -16,6 +16,8 @@ urlpatterns = [
     
     path('auth/profile/', views.UserProfileView.as_view(), name='profile'),
 
+    path('stream/', realtime.event_stream, name='event-stream'),
+
     path('users/search/', views.UserSearchView.as_view(), name='user-search'),
     
     
@@ -38,6 +40,8 @@ urlpatterns = [
     path('admin/teachers/create/', views.CreateTeacherView.as_view(), name='create-teacher'),
     
     path('admin/teachers/<int:pk>/', views.DeleteTeacherView.as_view(), name='delete-teacher'),
+
+    path('admin/db-connections/', views.DatabaseConnectionsView.as_view(), name='db-connections'),
     
     
 
@@ -73,6 +77,8 @@ urlpatterns = [
     path('grades/my-grades/', views.StudentGradesView.as_view(), name='my-grades'),
     
     path('grades/course/<int:course_id>/students/', views.CourseStudentsGradesView.as_view(), name='course-grades'),
+
+    path('grades/gradebook/<int:assignment_id>/', views.GradebookView.as_view(), name='gradebook'),
     
     
 
@@ -99,10 +105,16 @@ urlpatterns = [
     
     path('timetables/my-timetable/', views.StudentTimetableView.as_view(), name='my-timetable'),
 
+    path('dashboard/', views.StudentDashboardView.as_view(), name='student-dashboard'),
+
 
     path('notifications/', views.NotificationListView.as_view(), name='notifications'),
     path('notifications/<int:pk>/read/', views.NotificationMarkReadView.as_view(), name='notification-mark-read'),
+    path('notifications/read/', views.NotificationBulkReadView.as_view(), name='notification-bulk-read'),
+    path('notifications/unread-count/', views.UnreadCountView.as_view(), name='unread-count'),
     path('messages/', views.MessageListCreateView.as_view(), name='messages'),
+    path('messages/read/', views.MessageMarkReadView.as_view(), name='message-mark-read'),
+    path('messages/conversations/', views.ConversationListView.as_view(), name='conversations'),
     
 
     path('schedule/', views.ScheduleSessionViewSet.as_view({'get': 'list', 'post': 'create'}), name='schedule-list'),
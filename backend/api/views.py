@@ -3,16 +3,155 @@ Campus Connect - API Views
 """
 
 from rest_framework import generics, status, permissions, filters, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession
+from .models import User, Course, Group, Grade, Attendance, CourseFile, Timetable, CourseAssignment, Message, Notification, ScheduleSession, Conversation
 from .serializers import *
 from .permissions import IsAdmin, IsTeacher, IsStudent, IsApprovedStudent
+from . import catalog, database, replicas
+from .search import COURSE_SEARCH_VECTOR, USER_SEARCH_VECTOR, RankedSearchFilter
+from .authentication import CampusAccessToken, CampusRefreshToken
+from .badges import unread_counts, refresh_unread_counts
+from .scopes import get_scope
+from .pagination import (
+    MessageCursorPagination, NotificationCursorPagination, AttendanceCursorPagination, ConversationCursorPagination,
+)
+
+
+# Shared View Behaviour
+
+class EagerLoadingViewMixin:
+    """
+    Applies the relations declared by the serializer to the view's queryset
+    
+    Hooked into filter_queryset() so it covers list and detail lookups even
+    when get_queryset() is overridden.
+    
+    GET requests may ask for a sparse fieldset with `?fields=id,title` and/or
+    `?exclude=description`: only those fields are serialized and only the
+    columns and relations they read are loaded.
+    """
+    
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            # Keyset cursors are built from the time field of the boundary row
+            time_field = getattr(self.paginator, 'time_field', None)
+            queryset = serializer_class.setup_eager_loading(
+                queryset, self.get_sparse_fields(), [time_field] if time_field else []
+            )
+        return queryset
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+    
+    def get_sparse_fields(self):
+        """Field names kept by `fields` / `exclude`, or None to send them all"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
+    
+    def parse_sparse_fields(self):
+        params = self.request.query_params
+        serializer_class = self.get_serializer_class()
+        if (
+            self.request.method not in permissions.SAFE_METHODS
+            or not hasattr(serializer_class, 'readable_fields')
+            or not {self.fields_query_param, self.exclude_query_param} & params.keys()
+        ):
+            return None
+        
+        def names(param):
+            return [name.strip() for name in params.get(param, '').split(',') if name.strip()]
+        
+        available = serializer_class.readable_fields()
+        wanted = names(self.fields_query_param) or available
+        excluded = names(self.exclude_query_param)
+        unknown = [name for name in wanted + excluded if name not in available]
+        if unknown:
+            raise ValidationError({'fields': [f'Unknown field: {name}' for name in unknown]})
+        return [name for name in available if name in wanted and name not in excluded]
+
+
+class ReplicaReadMixin:
+    """
+    Lists from the read replica (api/replicas.py) unless the user wrote moments ago
+    """
+
+    def list(self, request, *args, **kwargs):
+        with replicas.replica_reads(request.user):
+            return super().list(request, *args, **kwargs)
+
+
+class CatalogCacheMixin:
+    """
+    Caches list and detail responses of rarely changing catalog data
+    
+    Responses are keyed by the request path and the versions of
+    `catalog_tables` (see catalog.py), and carry ETag and Last-Modified so a
+    client revalidating an unchanged page gets a 304 before anything is read
+    or serialized. Responses must not depend on who is asking, unless
+    get_catalog_tables() adds the user's own version.
+    """
+    
+    catalog_tables = ()
+    
+    def get_catalog_tables(self):
+        return self.catalog_tables
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+    
+    def cached_response(self, handler, request, *args, **kwargs):
+        versions = catalog.get_versions(self.get_catalog_tables())
+        # The same URL may be rendered as JSON or compact JSON depending on Accept
+        scope = f'{type(self).__name__}:{request.accepted_renderer.format}:{request.get_full_path()}'
+        tag = catalog.fingerprint(scope, versions)
+        etag = quote_etag(tag)
+        last_modified = catalog.last_modified(versions)
+        
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return self.tag_response(not_modified, etag, last_modified)
+        
+        key = f'catalog:{tag}'
+        data = cache.get(key)
+        if data is not None:
+            return self.tag_response(Response(data), etag, last_modified)
+        
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, catalog.CACHE_TIMEOUT)
+            self.tag_response(response, etag, last_modified)
+        return response
+    
+    def tag_response(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Stored by the client, but revalidated on every use
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 # Authentication Views
@@ -41,7 +180,7 @@ class LoginView(APIView):
         user = serializer.validated_data['user']
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = CampusRefreshToken.for_user(user)
         
         return Response({
             'access': str(refresh.access_token),
@@ -51,39 +190,54 @@ class LoginView(APIView):
 
 
 class LogoutView(APIView):
+    """
+    Revoke the access token of the request and, when sent, the refresh token
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
+        raw_refresh = request.data.get('refresh')
+        if raw_refresh:
+            try:
+                refresh = CampusRefreshToken(raw_refresh)
+            except TokenError:
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({'error': 'Invalid refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            refresh.blacklist()
+        
+        if isinstance(request.auth, CampusAccessToken):
+            request.auth.blacklist()
+        
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(EagerLoadingViewMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        # A user authenticated from a token only holds its claims: read the row and group at once
+        return self.filter_queryset(User.objects.filter(pk=self.request.user.pk)).get()
 
 
-class UserSearchView(generics.ListAPIView):
+class UserSearchView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = UserSearchSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [RankedSearchFilter]
     search_fields = ['first_name', 'last_name', 'username', 'email']
+    search_vector = USER_SEARCH_VECTOR
 
     def get_queryset(self):
-        return User.objects.filter(is_active=True).filter(
-            Q(role=User.STUDENT, is_approved=True) |
-            Q(role=User.TEACHER) |
-            Q(role=User.ADMIN) |
-            Q(is_staff=True) |
-            Q(is_superuser=True)
-        ).exclude(id=self.request.user.id).distinct()
+        # Everyone active except students awaiting approval (staff and superusers always show)
+        return User.objects.filter(is_active=True).exclude(
+            role=User.STUDENT, is_approved=False, is_staff=False, is_superuser=False,
+        ).exclude(id=self.request.user.id)
 
 
 # Admin Views - User Management
 
-class PendingStudentsView(generics.ListAPIView):
+class PendingStudentsView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = StudentDetailSerializer
     permission_classes = [IsAdmin]
     
@@ -130,12 +284,13 @@ class DeleteStudentView(generics.DestroyAPIView):
     queryset = User.objects.filter(role=User.STUDENT)
 
 
-class StudentListView(generics.ListAPIView):
+class StudentListView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = StudentDetailSerializer
     permission_classes = [IsAdmin]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, RankedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_approved', 'group', 'program', 'semester']
     search_fields = ['username', 'first_name', 'last_name', 'email', 'student_id']
+    search_vector = USER_SEARCH_VECTOR
     ordering_fields = ['username', 'created_at', 'student_id']
     
     def get_queryset(self):
@@ -166,7 +321,7 @@ class AssignStudentToGroupView(APIView):
             return Response({'error': 'Group not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class TeacherListView(generics.ListAPIView):
+class TeacherListView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = TeacherDetailSerializer
     permission_classes = [IsAdmin]
     filter_backends = [filters.SearchFilter]
@@ -210,13 +365,25 @@ class DeleteTeacherView(generics.DestroyAPIView):
     queryset = User.objects.filter(role=User.TEACHER)
 
 
+class DatabaseConnectionsView(APIView):
+    """
+    Connection reuse of the worker process answering: pool checkouts, waits and sizes
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(database.connection_stats())
+
+
 # Course Management Views
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(CatalogCacheMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Course.objects.all()
+    catalog_tables = (catalog.COURSES,)
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [RankedSearchFilter, filters.OrderingFilter]
     search_fields = ['code', 'name']
+    search_vector = COURSE_SEARCH_VECTOR
     ordering_fields = ['code', 'name', 'credits']
     
     def get_serializer_class(self):
@@ -230,9 +397,10 @@ class CourseListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseDetailView(CatalogCacheMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    catalog_tables = (catalog.COURSES,)
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -240,7 +408,7 @@ class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class TeacherCoursesView(generics.ListAPIView):
+class TeacherCoursesView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsTeacher]
     
@@ -248,14 +416,14 @@ class TeacherCoursesView(generics.ListAPIView):
         return CourseAssignment.objects.filter(teacher=self.request.user)
 
 
-class StudentCoursesView(generics.ListAPIView):
+class StudentCoursesView(EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsStudent]
     
     def get_queryset(self):
         student = self.request.user
-        if student.group:
-            return CourseAssignment.objects.filter(group=student.group)
+        if student.group_id:
+            return CourseAssignment.objects.filter(group_id=student.group_id)
         return CourseAssignment.objects.none()
 
 
@@ -284,9 +452,14 @@ class AssignCourseToGroupView(APIView):
 
 # Group Management Views
 
-class GroupListCreateView(generics.ListCreateAPIView):
+# Everything GroupSerializer reads: the group, its nested courses and its student count
+GROUP_CATALOG_TABLES = (catalog.GROUPS, catalog.GROUP_COURSES, catalog.COURSES, catalog.GROUP_STUDENTS)
+
+
+class GroupListCreateView(CatalogCacheMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    catalog_tables = GROUP_CATALOG_TABLES
     
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -294,9 +467,10 @@ class GroupListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAuthenticated()]
 
 
-class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
+class GroupDetailView(CatalogCacheMixin, EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
+    catalog_tables = GROUP_CATALOG_TABLES
     
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
@@ -306,7 +480,7 @@ class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # Course Assignment Views
 
-class CourseAssignmentListCreateView(generics.ListCreateAPIView):
+class CourseAssignmentListCreateView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     queryset = CourseAssignment.objects.all()
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsAdmin]
@@ -314,7 +488,7 @@ class CourseAssignmentListCreateView(generics.ListCreateAPIView):
     filterset_fields = ['group', 'teacher', 'course']
 
 
-class CourseAssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CourseAssignmentDetailView(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CourseAssignment.objects.all()
     serializer_class = CourseAssignmentSerializer
     permission_classes = [IsAdmin]
@@ -322,32 +496,33 @@ class CourseAssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # Grade Management Views
 
-class GradeListCreateView(generics.ListCreateAPIView):
+class GradeListCreateView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsTeacher]
     
     def get_queryset(self):
         queryset = Grade.objects.all()
         
+        course_id = self.request.query_params.get('course_id')
         if course_id:
             queryset = queryset.filter(course_id=course_id)
         
         if self.request.user.role == User.TEACHER:
-            queryset = queryset.filter(course__teacher=self.request.user)
+            queryset = queryset.filter(course_id__in=get_scope(self.request.user).course_ids)
         
         return queryset
 
 
-class GradeUpdateView(generics.UpdateAPIView):
+class GradeUpdateView(EagerLoadingViewMixin, generics.UpdateAPIView):
     queryset = Grade.objects.all()
     serializer_class = GradeUpdateSerializer
     permission_classes = [IsTeacher]
     
     def get_queryset(self):
-        return Grade.objects.filter(course__teacher=self.request.user)
+        return Grade.objects.filter(course_id__in=get_scope(self.request.user).course_ids)
 
 
-class StudentGradesView(generics.ListAPIView):
+class StudentGradesView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsStudent]
     
@@ -355,7 +530,7 @@ class StudentGradesView(generics.ListAPIView):
         return Grade.objects.filter(student=self.request.user)
 
 
-class CourseStudentsGradesView(generics.ListAPIView):
+class CourseStudentsGradesView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = GradeSerializer
     permission_classes = [IsTeacher]
     
@@ -363,33 +538,134 @@ class CourseStudentsGradesView(generics.ListAPIView):
         assignment_id = self.kwargs['course_id']
         
         assignment = get_object_or_404(CourseAssignment, pk=assignment_id, teacher=self.request.user)
-        course = assignment.course
-        group = assignment.group
         
-        students = User.objects.filter(
-            role=User.STUDENT,
-            group=group
+        # Grade rows are provisioned when the assignment is created or a student joins the group
+        return Grade.objects.filter(
+            course_id=assignment.course_id,
+            student__group_id=assignment.group_id
         )
+
+
+class GradebookView(APIView):
+    """
+    Grade sheet of one course assignment as a students x marks matrix
+    
+    GET returns one row per student with their marks in `columns` order and
+    the row's `updated_at` version. PUT takes `{"rows": [...]}` with the
+    changed rows, each carrying the version it was edited from, and applies
+    the whole sheet in one transaction: if any row changed meanwhile nothing
+    is written and the current state of the stale rows comes back with 409.
+    """
+    permission_classes = [IsTeacher]
+    columns = Grade.MARK_FIELDS + ('average',)
+    
+    def get_assignment(self, request, assignment_id):
+        return get_object_or_404(
+            CourseAssignment.objects.select_related('course', 'group'),
+            pk=assignment_id, teacher_id=request.user.id
+        )
+    
+    def get_grades(self, assignment):
+        # Rows are provisioned for every student of the group (see signals.py)
+        return Grade.objects.filter(
+            course_id=assignment.course_id, student__group_id=assignment.group_id
+        ).select_related('student').order_by('student__last_name', 'student__first_name', 'student_id')
+    
+    @staticmethod
+    def format_mark(value):
+        # Same string form as the grade serializers
+        return None if value is None else f'{value:.2f}'
+    
+    def serialize_row(self, grade):
+        return {
+            'student': grade.student_id,
+            'student_id': grade.student.student_id,
+            'name': grade.student.get_full_name(),
+            'updated_at': grade.updated_at.isoformat(),
+            'marks': [self.format_mark(getattr(grade, column)) for column in self.columns],
+        }
+    
+    def sheet(self, assignment, grades):
+        return {
+            'assignment': assignment.id,
+            'course': {'id': assignment.course_id, 'code': assignment.course.code, 'name': assignment.course.name},
+            'group': {'id': assignment.group_id, 'name': assignment.group.name},
+            'columns': list(self.columns),
+            'rows': [self.serialize_row(grade) for grade in grades],
+        }
+    
+    def get(self, request, assignment_id):
+        assignment = self.get_assignment(request, assignment_id)
+        return Response(self.sheet(assignment, self.get_grades(assignment)))
+    
+    def put(self, request, assignment_id):
+        assignment = self.get_assignment(request, assignment_id)
+        rows = request.data.get('rows')
+        if not isinstance(rows, list):
+            return Response({'error': 'rows must be a list'}, status=status.HTTP_400_BAD_REQUEST)
         
-        for student in students:
-            Grade.objects.get_or_create(
-                student=student,
-                course=course
-            )
+        errors = []
+        changes = {}
+        for index, data in enumerate(rows):
+            row = GradebookRowSerializer(data=data)
+            if not row.is_valid():
+                errors.append({'index': index, 'errors': row.errors})
+            elif row.validated_data['student'] in changes:
+                errors.append({'index': index, 'errors': {'student': ['Student appears more than once']}})
+            else:
+                changes[row.validated_data['student']] = (index, row.validated_data)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Grade.objects.filter(course=course, student__group=group)
+        with transaction.atomic():
+            grades = list(self.get_grades(assignment).select_for_update(of=('self',)))
+            by_student = {grade.student_id: grade for grade in grades}
+            
+            conflicts = []
+            for student_id, (index, values) in changes.items():
+                grade = by_student.get(student_id)
+                if grade is None:
+                    errors.append({'index': index, 'errors': {'student': ['Student is not in this course']}})
+                elif grade.updated_at != values['updated_at']:
+                    conflicts.append(self.serialize_row(grade))
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            if conflicts:
+                return Response(
+                    {'error': 'Some rows were changed by someone else', 'conflicts': conflicts},
+                    status=status.HTTP_409_CONFLICT
+                )
+            
+            now = timezone.now()
+            changed = []
+            for student_id, (_, values) in changes.items():
+                grade = by_student[student_id]
+                marks = {name: values[name] for name in Grade.MARK_FIELDS if name in values}
+                if all(getattr(grade, name) == value for name, value in marks.items()):
+                    continue
+                for name, value in marks.items():
+                    setattr(grade, name, value)
+                # bulk_update skips auto_now, the version has to move by hand
+                grade.updated_at = now
+                changed.append(grade)
+            if changed:
+                Grade.objects.bulk_update(changed, list(Grade.MARK_FIELDS) + ['updated_at'])
+        
+        if changed:
+            catalog.bump(*{catalog.user_records(grade.student_id) for grade in changed})
+        response = self.sheet(assignment, grades)
+        response['updated'] = len(changed)
+        return Response(response)
 
 
 # Attendance Views
 
-class AttendanceListCreateView(generics.ListCreateAPIView):
+class AttendanceListCreateView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsTeacher]
     
     def get_queryset(self):
-        queryset = Attendance.objects.filter(
-            course__assignments__teacher=self.request.user
-        ).distinct()
+        queryset = Attendance.objects.filter(course_id__in=get_scope(self.request.user).course_ids)
         
         course_id = self.request.query_params.get('course_id')
         week = self.request.query_params.get('week')
@@ -403,36 +679,86 @@ class AttendanceListCreateView(generics.ListCreateAPIView):
 
 
 class BulkAttendanceView(APIView):
+    """
+    Record a whole roll call in one request
+    
+    Every record is validated and authorized up front, then all changes are
+    written with one upsert, which creates new rows and updates existing ones.
+    Records that cannot be applied are reported back by their index.
+    """
     permission_classes = [IsTeacher]
     
     def post(self, request):
         records = request.data.get('attendance', [])
-        results = []
-        for data in records:
-            student_id = data.get('student')
-            course_id = data.get('course')
-            week_number = data.get('week_number')
-            
-            if not CourseAssignment.objects.filter(course_id=course_id, teacher=request.user).exists():
+        if not isinstance(records, list):
+            return Response({'error': 'attendance must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        errors = []
+        entries = {}
+        for index, data in enumerate(records):
+            record = BulkAttendanceRecordSerializer(data=data)
+            if not record.is_valid():
+                errors.append({'index': index, 'errors': record.errors})
                 continue
-                
-            attendance, created = Attendance.objects.update_or_create(
-                student_id=student_id,
-                course_id=course_id,
-                week_number=week_number,
-                defaults={
-                    'status': data.get('status'),
-                    'notes': data.get('notes', '')
-                }
-            )
-            results.append(AttendanceSerializer(attendance).data)
-            
-        return Response(results, status=status.HTTP_200_OK)
+            values = record.validated_data
+            key = (values['student'], values['course'], values['week_number'])
+            # A later record for the same student/course/week wins
+            entries.pop(key, None)
+            entries[key] = (index, values)
+        
+        course_ids = {course_id for _, course_id, _ in entries}
+        student_ids = {student_id for student_id, _, _ in entries}
+        allowed_courses = course_ids & get_scope(request.user).course_ids
+        known_students = set(
+            User.objects.filter(role=User.STUDENT, id__in=student_ids).values_list('id', flat=True)
+        )
+        
+        for key, (index, values) in list(entries.items()):
+            student_id, course_id, _ = key
+            if course_id not in allowed_courses:
+                errors.append({'index': index, 'errors': {'course': ['You are not assigned to this course']}})
+            elif student_id not in known_students:
+                errors.append({'index': index, 'errors': {'student': ['Student not found']}})
+            else:
+                continue
+            del entries[key]
+        
+        batch = Attendance.objects.filter(
+            student_id__in={student_id for student_id, _, _ in entries},
+            course_id__in={course_id for _, course_id, _ in entries},
+            week_number__in={week for _, _, week in entries},
+        )
+        if entries:
+            # One upsert: a concurrent roll call for the same week updates the row
+            # it inserted instead of failing on the unique constraint
+            Attendance.objects.bulk_create([
+                Attendance(
+                    student_id=student_id,
+                    course_id=course_id,
+                    week_number=week_number,
+                    status=values['status'],
+                    notes=values['notes'],
+                )
+                for (student_id, course_id, week_number), (_, values) in entries.items()
+            ], update_conflicts=True, unique_fields=['student', 'course', 'week_number'],
+                update_fields=['status', 'notes'])
+        # Bulk writes send no signals
+        catalog.bump(*{catalog.user_records(student_id) for student_id, _, _ in entries})
+        
+        saved = {
+            (attendance.student_id, attendance.course_id, attendance.week_number): attendance
+            for attendance in batch.select_related('student', 'course')
+        } if entries else {}
+        results = [AttendanceSerializer(saved[key]).data for key in entries]
+        errors.sort(key=lambda error: error['index'])
+        
+        return Response({'results': results, 'errors': errors}, status=status.HTTP_200_OK)
 
 
-class StudentAttendanceView(generics.ListAPIView):
+class StudentAttendanceView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = AttendanceSerializer
     permission_classes = [IsStudent]
+    pagination_class = AttendanceCursorPagination
     
     def get_queryset(self):
         return Attendance.objects.filter(student=self.request.user)
@@ -440,7 +766,7 @@ class StudentAttendanceView(generics.ListAPIView):
 
 # File Management Views
 
-class CourseFileListCreateView(generics.ListCreateAPIView):
+class CourseFileListCreateView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = CourseFileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -451,14 +777,8 @@ class CourseFileListCreateView(generics.ListCreateAPIView):
         if course_id:
             queryset = queryset.filter(course_id=course_id)
         
-        if self.request.user.role == User.STUDENT:
-            if self.request.user.group:
-                queryset = queryset.filter(course__groups=self.request.user.group)
-            else:
-                queryset = CourseFile.objects.none()
-        
-        elif self.request.user.role == User.TEACHER:
-            queryset = queryset.filter(course__teacher=self.request.user)
+        if self.request.user.role in (User.STUDENT, User.TEACHER):
+            queryset = queryset.filter(course_id__in=get_scope(self.request.user).course_ids)
         
         return queryset
     
@@ -466,7 +786,7 @@ class CourseFileListCreateView(generics.ListCreateAPIView):
         serializer.save(uploaded_by=self.request.user)
 
 
-class CourseFileDetailView(generics.RetrieveDestroyAPIView):
+class CourseFileDetailView(EagerLoadingViewMixin, generics.RetrieveDestroyAPIView):
     queryset = CourseFile.objects.all()
     serializer_class = CourseFileSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -486,7 +806,7 @@ class CourseFileDetailView(generics.RetrieveDestroyAPIView):
 
 # Timetable Views
 
-class TimetableListCreateView(generics.ListCreateAPIView):
+class TimetableListCreateView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
     serializer_class = TimetableSerializer
     
     def get_permissions(self):
@@ -498,15 +818,15 @@ class TimetableListCreateView(generics.ListCreateAPIView):
         queryset = Timetable.objects.filter(is_active=True)
         
         if self.request.user.role == User.STUDENT:
-            if self.request.user.group:
-                queryset = queryset.filter(group=self.request.user.group)
+            if self.request.user.group_id:
+                queryset = queryset.filter(group_id=self.request.user.group_id)
             else:
                 queryset = Timetable.objects.none()
         
         return queryset
 
 
-class TimetableDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TimetableDetailView(EagerLoadingViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Get, Update, or Delete a timetable
     """
@@ -532,16 +852,16 @@ class StudentTimetableView(APIView):
     def get(self, request):
         student = request.user
         
-        if not student.group:
+        if not student.group_id:
             return Response(
                 {'message': 'You are not assigned to any group yet'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         timetable = Timetable.objects.filter(
-            group=student.group,
+            group_id=student.group_id,
             is_active=True
-        ).first()
+        ).select_related('group').first()
         
         if not timetable:
             return Response(
@@ -552,14 +872,90 @@ class StudentTimetableView(APIView):
         return Response(TimetableSerializer(timetable).data)
 
 
+# Dashboard
+
+class StudentDashboardView(CatalogCacheMixin, APIView):
+    """
+    Everything the student home screen shows, in one response
+    
+    `sections` selects what to return, e.g. `?sections=grades,notifications`;
+    by default every section is included. Each section costs a fixed number
+    of queries, and the response is cached until one of the student's own
+    rows or the catalog data it shows changes.
+    """
+    permission_classes = [IsStudent]
+    sections = ('profile', 'courses', 'grades', 'attendance', 'timetable', 'notifications', 'unread')
+    recent_size = 20
+    
+    def get_catalog_tables(self):
+        return (
+            catalog.user_records(self.request.user.id),
+            catalog.COURSES, catalog.GROUPS, catalog.ASSIGNMENTS,
+            catalog.SCHEDULES, catalog.TEACHERS, catalog.TIMETABLES,
+        )
+    
+    def get(self, request):
+        requested = request.query_params.get('sections')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+            unknown = set(names) - set(self.sections)
+            if unknown:
+                return Response(
+                    {'error': f'Unknown sections: {", ".join(sorted(unknown))}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            names = self.sections
+        return self.cached_response(self.build, request, names)
+    
+    def build(self, request, names):
+        return Response({name: getattr(self, f'get_{name}')(request.user) for name in names})
+    
+    def get_profile(self, user):
+        return UserSerializer(User.objects.select_related('group').get(pk=user.pk)).data
+    
+    def get_courses(self, user):
+        if not user.group_id:
+            return []
+        queryset = CourseAssignment.objects.filter(group_id=user.group_id)
+        return CourseAssignmentSerializer(CourseAssignmentSerializer.setup_eager_loading(queryset), many=True).data
+    
+    def get_grades(self, user):
+        queryset = Grade.objects.filter(student_id=user.id)
+        return GradeSerializer(GradeSerializer.setup_eager_loading(queryset), many=True).data
+    
+    def get_attendance(self, user):
+        # The newest records, oldest first like the attendance feed
+        queryset = AttendanceSerializer.setup_eager_loading(Attendance.objects.filter(student_id=user.id))
+        records = list(queryset.order_by('-created_at', '-id')[:self.recent_size])
+        records.reverse()
+        return AttendanceSerializer(records, many=True).data
+    
+    def get_timetable(self, user):
+        if not user.group_id:
+            return None
+        timetable = Timetable.objects.filter(
+            group_id=user.group_id, is_active=True
+        ).select_related('group').first()
+        return TimetableSerializer(timetable).data if timetable else None
+    
+    def get_notifications(self, user):
+        queryset = Notification.objects.filter(user_id=user.id).order_by('-created_at', '-id')
+        return NotificationSerializer(queryset[:self.recent_size], many=True).data
+    
+    def get_unread(self, user):
+        return unread_counts(user.id)
+
+
 # Interaction Views (Messages & Notifications)
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(EagerLoadingViewMixin, generics.ListAPIView):
     """
     List notifications for current user
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
 
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
@@ -572,18 +968,52 @@ class NotificationMarkReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        notification = get_object_or_404(Notification, pk=pk, user=request.user)
-        notification.is_read = True
-        notification.save()
+        updated = Notification.objects.filter(pk=pk, user=request.user).update(is_read=True)
+        if not updated:
+            return Response({'error': 'Notification not found'}, status=status.HTTP_404_NOT_FOUND)
+        # update() sends no signals
+        catalog.bump(catalog.user_records(request.user.id))
+        refresh_unread_counts(request.user.id)
         return Response({'status': 'notification marked as read'})
 
 
-class MessageListCreateView(generics.ListCreateAPIView):
+class NotificationBulkReadView(APIView):
+    """
+    Mark a set of notifications as read with a single UPDATE
+    
+    With no body every unread notification is marked. `notification_type`
+    limits it to one type and `up_to_id` to notifications up to that id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        queryset = Notification.objects.filter(user=request.user, is_read=False)
+        
+        notification_type = request.data.get('notification_type')
+        if notification_type:
+            if notification_type not in dict(Notification.NOTIFICATION_TYPES):
+                return Response({'error': 'Unknown notification type'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(notification_type=notification_type)
+        
+        up_to_id = request.data.get('up_to_id')
+        if up_to_id is not None:
+            try:
+                queryset = queryset.filter(id__lte=int(up_to_id))
+            except (TypeError, ValueError):
+                return Response({'error': 'up_to_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        updated = queryset.update(is_read=True)
+        catalog.bump(catalog.user_records(request.user.id))
+        return Response({'updated': updated, 'unread': refresh_unread_counts(request.user.id)})
+
+
+class MessageListCreateView(EagerLoadingViewMixin, generics.ListCreateAPIView):
     """
     List messages with a specific user or send a new message
     """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
 
     def get_queryset(self):
         other_user_id = self.request.query_params.get('with_user')
@@ -599,26 +1029,75 @@ class MessageListCreateView(generics.ListCreateAPIView):
         )
 
     def perform_create(self, serializer):
-        message = serializer.save(sender=self.request.user)
+        with transaction.atomic():
+            message = serializer.save(sender=self.request.user)
+            Conversation.record(message)
+            
+            # Create a notification for the receiver
+            sender = self.request.user
+            sender_display_name = sender.get_full_name().strip() or sender.username
+            
+            Notification.objects.create(
+                user=message.receiver,
+                title=f"New Message from {sender_display_name}",
+                message=message.content[:100] + ("..." if len(message.content) > 100 else ""),
+                notification_type='MESSAGE'
+            )
+
+
+class MessageMarkReadView(APIView):
+    """
+    Mark every message received from `with_user` as read
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            other_user_id = int(request.data.get('with_user'))
+        except (TypeError, ValueError):
+            return Response({'error': 'with_user must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create a notification for the receiver
-        sender = self.request.user
-        sender_display_name = sender.get_full_name().strip() or sender.username
+        with transaction.atomic():
+            updated = Message.objects.filter(
+                sender_id=other_user_id, receiver=request.user, is_read=False
+            ).update(is_read=True)
+            Conversation.objects.filter(owner=request.user, peer_id=other_user_id).update(unread_count=0)
+        catalog.bump(catalog.user_records(request.user.id))
         
-        Notification.objects.create(
-            user=message.receiver,
-            title=f"New Message from {sender_display_name}",
-            message=message.content[:100] + ("..." if len(message.content) > 100 else ""),
-            notification_type='MESSAGE'
-        )
+        return Response({'updated': updated, 'unread': refresh_unread_counts(request.user.id)})
+
+
+class UnreadCountView(APIView):
+    """
+    Badge counts: unread notifications per type and unread messages per sender
+    
+    Served from a per-user cache entry kept current on create and mark-read.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(unread_counts(request.user.id))
+
+
+class ConversationListView(EagerLoadingViewMixin, generics.ListAPIView):
+    """
+    Inbox of the current user: one entry per chat, most recent first
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ConversationCursorPagination
+
+    def get_queryset(self):
+        return Conversation.objects.filter(owner=self.request.user)
 
 
-class ScheduleSessionViewSet(viewsets.ModelViewSet):
+class ScheduleSessionViewSet(CatalogCacheMixin, EagerLoadingViewMixin, viewsets.ModelViewSet):
     """
     CRUD for class schedule sessions.
     """
     queryset = ScheduleSession.objects.all()
     serializer_class = ScheduleSessionSerializer
+    catalog_tables = (catalog.SCHEDULES, catalog.ASSIGNMENTS, catalog.COURSES, catalog.GROUPS, catalog.TEACHERS)
     permission_classes = [IsAdmin]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['assignment__group', 'day']
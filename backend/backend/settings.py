@@ -2,7 +2,10 @@
 Campus Connect - Django Settings
 """
 
+import os
+import sys
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +35,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -40,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaStickinessMiddleware',
 ]
 
 
@@ -48,7 +53,7 @@ AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -56,7 +61,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.CompactJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DATETIME_FORMAT': '%Y-%m-%d %H:%M:%S',
 }
@@ -66,6 +77,7 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
     'ROTATE_REFRESH_TOKENS': True,
+    # Rotated refresh tokens are revoked through api/revocation.py
     'BLACKLIST_AFTER_ROTATION': True,
     
     'ALGORITHM': 'HS256',
@@ -77,8 +89,10 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
     
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('api.authentication.CampusAccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.TokenRefreshSerializer',
 }
 
 
@@ -107,17 +121,89 @@ CORS_ALLOW_HEADERS = [
 ]
 
 
+# Connections are reused across requests (api/database.py). With psycopg 3 and
+# psycopg_pool installed each worker process keeps a pool, which ASGI needs:
+# there, persistent connections would be held by short-lived threads (asgi.py
+# turns them off). Otherwise each thread keeps its connection for
+# DB_CONN_MAX_AGE seconds. Health checks replace connections the server
+# dropped. Keep DB_POOL_MAX_SIZE x worker processes under the server's
+# max_connections; `manage.py db_connections --workers N` checks it.
+DB_POOL = os.environ.get('DB_POOL', '1') == '1' and bool(find_spec('psycopg') and find_spec('psycopg_pool'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'campus_connect',
-        'USER': 'postgres',
-        'PASSWORD': 'admin',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'campus_connect'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'admin'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Pooling and persistent connections exclude each other
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                # Seconds a request waits for a free connection before failing
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'max_idle': 5 * 60,
+                'max_lifetime': 30 * 60,
+            },
+        } if DB_POOL else {},
     }
 }
 
+# Read replica (api/replicas.py): list endpoints read from it when
+# DB_REPLICA_HOST is set. Users who just wrote read from the primary for
+# REPLICA_STICKY_SECONDS, which should exceed the usual replication lag.
+# Tests run against the primary's test database through the replica alias,
+# which `manage.py test` defines without DB_REPLICA_HOST too, so the routing
+# is always tested.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif sys.argv[1:2] == ['test']:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
+
+# Per-process memory cache; point this at Redis or Memcached in production so
+# every worker shares the same badge counts, scopes and version counters
+# (`manage.py check --deploy` fails on this one, see api/checks.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'campus-connect',
+    }
+}
+
+# Real-time push (api/realtime.py). The in-memory broker only reaches clients
+# connected to the same process; with several ASGI workers use Redis:
+# REALTIME_BROKER = {'BACKEND': 'api.realtime.RedisBroker', 'URL': 'redis://localhost:6379/0'}
+REALTIME_BROKER = {
+    'BACKEND': 'api.realtime.InMemoryBroker',
+}
+
+
+# Per-request profiling (api/profiling.py): a Server-Timing header on every
+# response and rolling timings per endpoint for `manage.py slow_endpoints`.
+# The command reads what each worker flushes to the cache above.
+PROFILING = {
+    'ENABLED': False,
+    'WINDOW': 500,  # requests kept per endpoint and process
+    'FLUSH_SECONDS': 10,
+}
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'